@@ -0,0 +1,193 @@
+"""
+Fixture per il benchmark: risposte sintetiche ma realistiche (feed getcurrent,
+index.json, information table 13F, Form 4, stock watcher, file CIK), generate in
+modo deterministico, oppure risposte reali registrate dalla SEC.
+
+    python bench/fixtures.py record DIR URL [URL ...]
+
+salva le risposte reali in DIR; StubServer(fixtures_dir=DIR) le serve al posto
+di quelle sintetiche.
+"""
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+# Filer "notevoli" (nella watchlist di bot.py) mescolati a filer qualunque
+NOTABLE_FILERS = [
+    ('0001067983', 'BERKSHIRE HATHAWAY INC'),
+    ('0001649339', 'Scion Asset Management, LLC'),
+    ('0001336528', 'Pershing Square Capital Management, L.P.'),
+    ('0001350694', 'Bridgewater Associates, LP'),
+    ('0001423053', 'Citadel Advisors LLC'),
+]
+NOTABLE_EVERY = 10
+
+# Quante entry ha il feed getcurrent per ogni form
+FEED_SIZES = {'4': 300, 'SC 13D': 40, 'SC 13G': 40, 'SC 13G/A': 40, '13F-HR': 30}
+FORM_PREFIX = {'4': 1, 'SC 13D': 2, 'SC 13G': 3, 'SC 13G/A': 4, '13F-HR': 5}
+
+def fixture_name(path):
+    """Nome su disco di una risposta registrata (path + query)"""
+    return quote(path, safe='')
+
+def filer(form_type, i):
+    if i % NOTABLE_EVERY == 0:
+        return NOTABLE_FILERS[(i // NOTABLE_EVERY) % len(NOTABLE_FILERS)]
+    return f"{2000000 + FORM_PREFIX[form_type] * 10000 + i:010d}", f"COMPANY {form_type.replace(' ', '')}-{i} INC"
+
+def accession(form_type, i):
+    return f"{9000000000 + FORM_PREFIX[form_type]:010d}-26-{i:06d}"
+
+def feed_entries(base_url, form_type, now=None, total=None):
+    """Entry del feed, dalla più recente, una ogni due minuti"""
+    now = now or datetime.now().replace(microsecond=0)
+    entries = []
+    for i in range(total if total is not None else FEED_SIZES[form_type]):
+        cik, name = filer(form_type, i)
+        acc = accession(form_type, i)
+        entries.append({
+            'title': f"{form_type} - {name} ({cik}) (Filer)",
+            'link': f"{base_url}/Archives/edgar/data/{int(cik)}/{acc.replace('-', '')}/{acc}-index.htm",
+            'updated': (now - timedelta(minutes=2 * i)).isoformat() + '-04:00',
+            'form_type': form_type,
+        })
+    return entries
+
+def atom_page(entries, start, count):
+    items = ''.join(f"""
+<entry>
+<title>{e['title'].replace('&', '&amp;')}</title>
+<link rel="alternate" type="text/html" href="{e['link']}"/>
+<summary type="html">Filed: {e['updated'][:10]}</summary>
+<updated>{e['updated']}</updated>
+<category scheme="https://www.sec.gov/" label="form type" term="{e['form_type']}"/>
+<id>urn:tag:sec.gov,2008:accession-number={e['link'].rsplit('/', 1)[-1][:20]}</id>
+</entry>""" for e in entries[start:start + count])
+    return f"""<?xml version="1.0" encoding="ISO-8859-1" ?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Latest Filings</title>
+<updated>{datetime.now().isoformat()}</updated>{items}
+</feed>
+""".encode('latin-1')
+
+def index_json(folder, documents):
+    """index.json di una cartella EDGAR: documents = [(nome, dimensione)]"""
+    return json.dumps({'directory': {'name': folder, 'item': [
+        {'name': name, 'type': 'text.gif', 'size': str(size), 'last-modified': '2026-05-15 16:02:11'}
+        for name, size in documents
+    ]}}).encode()
+
+def info_table_rows(rows, seed=0):
+    rng = random.Random(seed)
+    for i in range(rows):
+        yield {
+            'name': f"ISSUER {i} CORP",
+            'cusip': f"{i:06d}{rng.randrange(100):02d}{i % 10}",
+            'shares': rng.randrange(1000, 10_000_000),
+            'value': rng.randrange(10, 5_000_000),
+            'put_call': 'Put' if i % 50 == 49 else '',
+        }
+
+def info_table(rows, seed=0):
+    """Information table 13F con `rows` righe, nel formato (e namespace) EDGAR"""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<informationTable xmlns="http://www.sec.gov/edgar/document/thirteenf/informationtable">\n']
+    for row in info_table_rows(rows, seed):
+        put_call = f"<putCall>{row['put_call']}</putCall>" if row['put_call'] else ''
+        parts.append(
+            f"<infoTable><nameOfIssuer>{row['name']}</nameOfIssuer><titleOfClass>COM</titleOfClass>"
+            f"<cusip>{row['cusip']}</cusip><value>{row['value']}</value>"
+            f"<shrsOrPrnAmt><sshPrnamt>{row['shares']}</sshPrnamt><sshPrnamtType>SH</sshPrnamtType></shrsOrPrnAmt>"
+            f"{put_call}<investmentDiscretion>SOLE</investmentDiscretion>"
+            f"<votingAuthority><Sole>{row['shares']}</Sole><Shared>0</Shared><None>0</None></votingAuthority></infoTable>\n")
+    parts.append('</informationTable>\n')
+    return ''.join(parts).encode()
+
+def form4(seed=0):
+    """Ownership document di un Form 4 con qualche transazione P/S"""
+    rng = random.Random(seed)
+    code = rng.choice('PPSSSMAF')
+    txs = ''.join(f"""
+  <nonDerivativeTransaction>
+    <securityTitle><value>Common Stock</value></securityTitle>
+    <transactionDate><value>2026-05-1{i}</value></transactionDate>
+    <transactionCoding><transactionFormType>4</transactionFormType><transactionCode>{code}</transactionCode></transactionCoding>
+    <transactionAmounts>
+      <transactionShares><value>{rng.randrange(100, 200000)}</value></transactionShares>
+      <transactionPricePerShare><value>{rng.uniform(5, 500):.2f}</value></transactionPricePerShare>
+      <transactionAcquiredDisposedCode><value>{'A' if code in 'PMA' else 'D'}</value></transactionAcquiredDisposedCode>
+    </transactionAmounts>
+    <postTransactionAmounts><sharesOwnedFollowingTransaction><value>{rng.randrange(10**5, 10**8)}</value></sharesOwnedFollowingTransaction></postTransactionAmounts>
+  </nonDerivativeTransaction>""" for i in range(rng.randrange(1, 6)))
+    return f"""<?xml version="1.0"?>
+<ownershipDocument>
+  <schemaVersion>X0508</schemaVersion>
+  <documentType>4</documentType>
+  <issuer><issuerCik>0000320193</issuerCik><issuerName>Apple Inc.</issuerName><issuerTradingSymbol>AAPL</issuerTradingSymbol></issuer>
+  <reportingOwner>
+    <reportingOwnerId><rptOwnerCik>0001067983</rptOwnerCik><rptOwnerName>BERKSHIRE HATHAWAY INC</rptOwnerName></reportingOwnerId>
+    <reportingOwnerRelationship><isTenPercentOwner>1</isTenPercentOwner></reportingOwnerRelationship>
+  </reportingOwner>
+  <nonDerivativeTable>{txs}
+  </nonDerivativeTable>
+</ownershipDocument>
+""".encode()
+
+def stock_watcher(trades, chamber='house', seed=0):
+    """all_transactions.json di House/Senate stock watcher (l'ultimo 1% recente)"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    owner_key = 'representative' if chamber == 'house' else 'senator'
+    result = []
+    for i in range(trades):
+        age = rng.randrange(1, 5) if i >= trades * 0.99 else rng.randrange(30, 2000)
+        result.append({
+            'disclosure_year': (today - timedelta(days=age)).year,
+            'disclosure_date': (today - timedelta(days=age)).strftime('%Y-%m-%d'),
+            'transaction_date': (today - timedelta(days=age + 20)).strftime('%Y-%m-%d'),
+            'owner': rng.choice(['self', 'joint', 'spouse']),
+            'ticker': rng.choice(['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN', '--']),
+            'asset_description': 'Common Stock',
+            'type': rng.choice(['purchase', 'sale_full', 'sale_partial']),
+            'amount': rng.choice(['$1,001 - $15,000', '$15,001 - $50,000', '$250,001 - $500,000']),
+            owner_key: f"Hon. Member {rng.randrange(400)}",
+            'district': 'CA11',
+            'ptr_link': f"https://disclosures-clerk.house.gov/{i}.pdf",
+            'cap_gains_over_200_usd': False,
+        })
+    return json.dumps(result).encode()
+
+def company_tickers():
+    companies = [(int(cik), name) for cik, name in NOTABLE_FILERS] + [(320193, 'Apple Inc.'), (789019, 'MICROSOFT CORP')]
+    return json.dumps({str(i): {'cik_str': cik, 'ticker': f"T{i}", 'title': name}
+                       for i, (cik, name) in enumerate(companies)}).encode()
+
+def cik_lookup(entities=50000):
+    lines = [f"{name.upper()}:{cik}:" for cik, name in NOTABLE_FILERS]
+    lines += [f"ENTITY NUMBER {i} LLC:{3000000 + i:010d}:" for i in range(entities)]
+    return ('\n'.join(lines) + '\n').encode('latin-1')
+
+def record(directory, urls):
+    """Scarica e salva risposte reali (User-Agent SEC di bot.py, rate limit incluso)"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('TELEGRAM_TOKEN', 'bench')
+    os.environ.setdefault('CHAT_ID', 'bench')
+    import bot
+    from urllib.parse import urlparse
+    os.makedirs(directory, exist_ok=True)
+    for url in urls:
+        parsed = urlparse(url)
+        response = bot.http_get(url, headers=bot.HEADERS)
+        response.raise_for_status()
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        with open(os.path.join(directory, fixture_name(path)), 'wb') as f:
+            f.write(response.content)
+        print(f"   ✓ {path} ({len(response.content)} bytes)")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] != 'record':
+        sys.exit(__doc__)
+    record(sys.argv[2], sys.argv[3:])
@@ -0,0 +1,147 @@
+"""
+Benchmark offline del bot contro lo stub locale (nessuna richiesta a SEC o Telegram).
+
+    python bench/run.py [--suite NAME ...] [--rows 50000] [--latency 0.02] [--error-rate 0.01] [--json out.json]
+
+Ogni suite gira in un processo separato (picco RSS misurato per suite) e riporta
+righe/s, richieste per run, wall time e picco di memoria.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures
+from stub_server import StubServer
+
+SUITES = ['startup', 'parse_13f', 'diff_13f', 'edgar_feed', 'end_to_end']
+
+def import_bot(stub):
+    """Importa bot.py puntato allo stub (gli endpoint si leggono all'import)"""
+    os.environ.update({
+        'TELEGRAM_TOKEN': 'bench', 'CHAT_ID': 'bench',
+        'SEC_BASE_URL': stub.url, 'TELEGRAM_API_URL': stub.url,
+        'HOUSE_WATCHER_URL': f"{stub.url}/house.json",
+        'SENATE_WATCHER_URL': f"{stub.url}/senate.json",
+        'TELEGRAM_CHAT_RATE': os.environ.get('TELEGRAM_CHAT_RATE', '1000'),
+    })
+    sys.path.insert(0, ROOT)
+    import bot
+    return bot
+
+def bench_startup(bot, stub, args):
+    # Cold start reale: un nuovo interprete che esegue bot.py come fa il cron
+    env = dict(os.environ)
+    started = time.time()
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, 'bot.py')], env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.time() - started
+    probe = subprocess.run([sys.executable, '-c', 'import time; t = time.perf_counter(); import bot; '
+                            'print(time.perf_counter() - t)'], env={**env, 'PYTHONPATH': ROOT},
+                           stdout=subprocess.PIPE, text=True)
+    return {'time_to_first_request': stub.first_request_at - started, 'import_seconds': float(probe.stdout),
+            'seconds': elapsed, 'exit_status': proc.returncode}
+
+def bench_parse_13f(bot, stub, args):
+    path = os.path.join(os.getcwd(), 'infotable.xml')
+    with open(path, 'wb') as f:
+        f.write(fixtures.info_table(args.rows))
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        table = bot.HoldingsTable.from_rows(bot.iter_13f_holdings(f))
+    elapsed = time.perf_counter() - started
+    return {'rows': args.rows, 'positions': len(table), 'seconds': elapsed, 'rows_per_s': args.rows / elapsed}
+
+def bench_diff_13f(bot, stub, args):
+    previous = bot.HoldingsTable.from_rows(fixtures.info_table_rows(args.rows, seed=1))
+    rows = list(fixtures.info_table_rows(args.rows, seed=1))
+    for i, row in enumerate(rows):
+        if i % 7 == 0:
+            row['value'] *= 2
+        row['cusip'] = row['cusip'] if i % 13 else f"X{row['cusip'][1:]}"
+    current = bot.HoldingsTable.from_rows(rows)
+    started = time.perf_counter()
+    changes = bot.compare_13f_holdings(current, previous)
+    elapsed = time.perf_counter() - started
+    return {'rows': args.rows, 'changes': sum(len(v) for v in changes.values()),
+            'seconds': elapsed, 'rows_per_s': 2 * args.rows / elapsed,
+            'numpy': bot.lazy_import('numpy', optional=True) is not None}
+
+def bench_edgar_feed(bot, stub, args):
+    started = time.perf_counter()
+    filings = bot.check_sec_filings('4', days_back=2, count=100)
+    elapsed = time.perf_counter() - started
+    return {'entries': len(filings), 'seconds': elapsed, 'entries_per_s': len(filings) / elapsed,
+            'requests': stub.requests()}
+
+def bench_end_to_end(bot, stub, args):
+    started = time.perf_counter()
+    bot.main()
+    elapsed = time.perf_counter() - started
+    return {'seconds': elapsed, 'requests': stub.requests(), 'sec_requests': stub.requests() - stub.requests('telegram'),
+            'telegram_messages': len(stub.messages), 'throttled': stub.requests('throttled'),
+            'mb_served': stub.bytes_sent / 2**20}
+
+def run_child(args):
+    workdir = tempfile.mkdtemp(prefix='insider-bench-')
+    os.chdir(workdir)
+    with StubServer(latency=args.latency, error_rate=args.error_rate,
+                    table_rows=args.table_rows, fixtures_dir=args.fixtures) as stub:
+        bot = import_bot(stub)
+        # L'output del bot va su stderr: su stdout solo il risultato JSON
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            result = globals()[f"bench_{args.suite}"](bot, stub, args)
+        finally:
+            sys.stdout = stdout
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+def run_suite(suite, args):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', '--suite', suite,
+           '--rows', str(args.rows), '--table-rows', str(args.table_rows),
+           '--latency', str(args.latency), '--error-rate', str(args.error_rate)]
+    if args.fixtures:
+        cmd += ['--fixtures', os.path.abspath(args.fixtures)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.DEVNULL, text=True)
+    if proc.returncode != 0:
+        return {'error': f"exit status {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', action='append', choices=SUITES, help="suites to run (default: all)")
+    parser.add_argument('--rows', type=int, default=50000, help="rows for the 13F parse/diff suites")
+    parser.add_argument('--table-rows', type=int, default=2000, help="rows of each 13F served by the stub")
+    parser.add_argument('--latency', type=float, default=0.0, help="stub latency per request (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub responses that are 429")
+    parser.add_argument('--fixtures', help="directory of recorded responses (bench/fixtures.py record)")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the bot output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.suite = args.suite[0]
+        run_child(args)
+        return
+
+    results = {}
+    for suite in args.suite or SUITES:
+        results[suite] = result = run_suite(suite, args)
+        metrics = '  '.join(f"{k}={v:,.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items())
+        print(f"{suite:<12} {metrics}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
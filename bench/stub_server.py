@@ -0,0 +1,207 @@
+"""
+Server HTTP locale che imita SEC, S3 (stock watcher) e Bot API di Telegram con
+le fixture di bench/fixtures.py. Latenza e risposte 429 sono configurabili; ogni
+risposta viene contata per tipo di endpoint e status.
+
+    python bench/stub_server.py [--port 8000] [--latency 0.05] [--error-rate 0.02]
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import fixtures
+
+FOLDER_RE = re.compile(r'^/Archives/edgar/data/(\d+)/(\d{18})/(.*)$')
+
+class StubServer:
+    """
+    Stub in un thread: `url` è la base da passare a SEC_BASE_URL/TELEGRAM_API_URL.
+    latency: secondi di attesa per richiesta; error_rate: frazione di 429 con
+    Retry-After: retry_after; table_rows: righe di ogni information table 13F.
+    """
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, retry_after=0,
+                 table_rows=5000, watcher_trades=20000, fixtures_dir=None, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.table_rows = table_rows
+        self.watcher_trades = watcher_trades
+        self.fixtures_dir = fixtures_dir
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.first_request_at = None
+        self.bytes_sent = 0
+        self.messages = []
+        self.lock = threading.Lock()
+        self._bodies = {}
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._entries = {form: fixtures.feed_entries(self.url, form) for form in fixtures.FEED_SIZES}
+        self._forms = {e['link'].split('/')[-2]: form for form, entries in self._entries.items() for e in entries}
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def requests(self, kind=None):
+        """Richieste servite (di un tipo, o tutte)"""
+        with self.lock:
+            return sum(n for (k, _), n in self.stats.items() if kind is None or k == kind)
+
+    def _body(self, key, build):
+        # Le fixture si generano una volta: il benchmark misura il bot, non lo stub
+        with self.lock:
+            body = self._bodies.get(key)
+        if body is None:
+            body = build()
+            with self.lock:
+                self._bodies[key] = body
+        return body
+
+    def _recorded(self, path):
+        if not self.fixtures_dir:
+            return None
+        try:
+            with open(os.path.join(self.fixtures_dir, fixtures.fixture_name(path)), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def route(self, method, path):
+        """(tipo, status, content type, body) per una richiesta"""
+        parsed = urlparse(path)
+        if method == 'POST' and parsed.path.endswith('/sendMessage'):
+            return 'telegram', 200, 'application/json', b'{"ok":true,"result":{"message_id":1}}'
+        recorded = self._recorded(path)
+        if recorded is not None:
+            return 'recorded', 200, 'application/octet-stream', recorded
+        if parsed.path == '/cgi-bin/browse-edgar':
+            query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            entries = self._entries.get(query.get('type'), [])
+            start, count = int(query.get('start', 0)), int(query.get('count', 40))
+            return 'atom', 200, 'application/atom+xml', fixtures.atom_page(entries, start, count)
+        if parsed.path == '/files/company_tickers.json':
+            return 'cik', 200, 'application/json', self._body('tickers', fixtures.company_tickers)
+        if parsed.path == '/Archives/edgar/cik-lookup-data.txt':
+            return 'cik', 200, 'text/plain', self._body('lookup', fixtures.cik_lookup)
+        if parsed.path in ('/house.json', '/senate.json'):
+            chamber = parsed.path[1:-5]
+            return 's3', 200, 'application/json', self._body(
+                chamber, lambda: fixtures.stock_watcher(self.watcher_trades, chamber))
+        m = FOLDER_RE.match(parsed.path)
+        if m:
+            folder, name = m.group(2), m.group(3)
+            form = self._forms.get(folder)
+            seed = int(folder[-6:])
+            if name == 'index.json':
+                if form == '13F-HR':
+                    documents = [('primary_doc.xml', 3000), ('infotable.xml', self.table_rows * 400)]
+                else:
+                    documents = [(f'{folder}.txt', 5000), ('form4.xml', 4000)]
+                return 'index', 200, 'application/json', fixtures.index_json(parsed.path.rsplit('/', 1)[0], documents)
+            if name == 'infotable.xml':
+                return 'document', 200, 'application/xml', self._body(
+                    ('13f', folder), lambda: fixtures.info_table(self.table_rows, seed))
+            if name == 'form4.xml':
+                return 'document', 200, 'application/xml', fixtures.form4(seed)
+        return 'missing', 404, 'text/plain', b'Not Found'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                with server.lock:
+                    if server.first_request_at is None:
+                        server.first_request_at = time.time()
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = self.rfile.read(length) if length else b''
+                if server.latency:
+                    time.sleep(server.latency)
+                with server.lock:
+                    throttled = server.error_rate and server.rng.random() < server.error_rate
+                if throttled:
+                    kind, status, ctype, body = 'throttled', 429, 'application/json', (
+                        b'{"ok":false,"error_code":429,"parameters":{"retry_after":%d}}' % server.retry_after)
+                    headers = {'Retry-After': str(server.retry_after)}
+                else:
+                    kind, status, ctype, body = server.route(method, self.path)
+                    headers = {}
+                    if kind == 'telegram':
+                        with server.lock:
+                            server.messages.append(payload)
+                    if kind == 's3':
+                        status, body, headers = self._s3(body)
+                with server.lock:
+                    server.stats[(kind, status)] += 1
+                    server.bytes_sent += len(body)
+                self.send_response(status)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _s3(self, body):
+                # Come S3: ETag, 304 su If-None-Match, 206 su Range
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+                if self.headers.get('If-None-Match') == etag:
+                    return 304, b'', headers
+                m = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if m and int(m.group(1)) < len(body):
+                    start = int(m.group(1))
+                    headers['Content-Range'] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                    return 206, body[start:], headers
+                return 200, body, headers
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+        return Handler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--table-rows', type=int, default=5000)
+    parser.add_argument('--fixtures', help="directory of recorded responses")
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.error_rate, table_rows=args.table_rows,
+                        fixtures_dir=args.fixtures)
+    print(f"Stub listening on {server.url}")
+    print(f"  SEC_BASE_URL={server.url} TELEGRAM_API_URL={server.url}")
+    print(f"  HOUSE_WATCHER_URL={server.url}/house.json SENATE_WATCHER_URL={server.url}/senate.json")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,16 +1,55 @@
-import requests
 import json
 import os
 from datetime import datetime, timedelta
-import xml.etree.ElementTree as ET
+from zoneinfo import ZoneInfo
 import time
+import io
 import re
-from collections import defaultdict
+import csv
+import gzip
+import signal
+import argparse
+import html
+import math
+import functools
+import contextlib
+import mmap
+import codecs
+import struct
+import sqlite3
+import random
+import bisect
+import hashlib
+import pickle
+import importlib
+import threading
+from array import array
+from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+@functools.lru_cache(maxsize=None)
+def lazy_import(name, optional=False):
+    """
+    Importa un modulo al primo uso invece che all'avvio (requests e numpy da soli
+    pesano ~200ms a ogni run). Con optional=True ritorna None se non è installato:
+    lxml (iterparse più veloce sui 13F enormi), numpy (diff 13F vettoriale),
+    ijson (JSON in streaming più veloce), pyinstrument (--profile run.html).
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        if optional:
+            return None
+        raise
 
 TELEGRAM_TOKEN = os.environ['TELEGRAM_TOKEN']
 CHAT_ID = os.environ['CHAT_ID']
-SEEN_FILE = 'seen_transactions.json'
-CACHE_13F_FILE = 'cache_13f.json'
+SEEN_FILE = 'seen_transactions.json'  # formato legacy, importato una volta sola
+CACHE_13F_FILE = 'cache_13f.json'  # formato legacy, importato una volta sola
+# Holdings 13F in colonne: HOLDINGS_DIR/<fondo>/<trimestre>.bin
+HOLDINGS_DIR = 'holdings_13f'
+HOLDINGS_HISTORY = 8  # trimestri tenuti per fondo
 
 # TIMEOUT GLOBALE per tutte le richieste
 REQUEST_TIMEOUT = 10
@@ -21,6 +60,124 @@ HEADERS = {
     'Host': 'www.sec.gov'
 }
 
+# Endpoint, sovrascrivibili da env per puntare il bot a uno stub locale (bench/)
+SEC_BASE_URL = os.environ.get('SEC_BASE_URL', 'https://www.sec.gov')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Limiti per host: (richieste/secondo, burst). La SEC chiede max 10 req/s,
+# restiamo un filo sotto. Gli host non elencati (S3) non vengono limitati.
+RATE_LIMITS = {
+    urlparse(SEC_BASE_URL).netloc: (9, 1),
+    urlparse(TELEGRAM_API_URL).netloc: (25, 5),
+}
+
+# Retry con backoff esponenziale + jitter sugli errori temporanei
+MAX_RETRIES = 4
+RETRY_BACKOFF = 0.5
+MAX_RETRY_WAIT = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Cache locale (ETag/Last-Modified + body) per le richieste condizionali
+CACHE_DIR = '.cache'
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, 'http')
+
+# Metriche della run: testo Prometheus in METRICS_FILE, JSON accanto
+METRICS_FILE = os.environ.get('METRICS_FILE', os.path.join(CACHE_DIR, 'metrics.prom'))
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Snapshot locali dei file all_transactions.json di House/Senate stock watcher
+HOUSE_WATCHER_URL = os.environ.get('HOUSE_WATCHER_URL', "https://house-stock-watcher-data.s3-us-west-2.amazonaws.com/data/all_transactions.json")
+SENATE_WATCHER_URL = os.environ.get('SENATE_WATCHER_URL', "https://senate-stock-watcher-data.s3-us-west-2.amazonaws.com/aggregate/all_transactions.json")
+STOCK_WATCHER_DIR = os.path.join(CACHE_DIR, 'stock_watcher')
+# Byte di coda riscaricati per verificare che il file sia solo cresciuto;
+# gli ultimi TAIL_SLACK possono cambiare (la "]" finale diventa ", {...}]")
+TAIL_OVERLAP = 4096
+TAIL_SLACK = 64
+
+# Dedup degli alert: 'log' (indice hash ordinato + log append-only) o 'sqlite'
+SEEN_BACKEND = os.environ.get('SEEN_BACKEND', 'log')
+SEEN_INDEX_FILE = 'seen.idx'
+SEEN_LOG_FILE = 'seen.log'
+SEEN_DB_FILE = 'seen.db'
+SEEN_BLOOM_FILE = os.path.join(CACHE_DIR, 'seen.bloom')
+SEEN_USE_BLOOM = os.environ.get('SEEN_BLOOM', '1') == '1'
+# Le finestre di lookback arrivano a 7 giorni: oltre i 14 un ID non ricompare più
+SEEN_RETENTION_DAYS = 14
+SEEN_COMPACT_THRESHOLD = 5000
+
+# accession 13F -> URL dell'information table
+DOCUMENT_MAP_FILE = os.path.join(CACHE_DIR, '13f_documents.json')
+
+# Cache dei documenti SEC scaricati (blob gzip per sha256, LRU per accession)
+FILING_CACHE_DIR = os.path.join(CACHE_DIR, 'filings')
+FILING_CACHE_MAX_BYTES = int(os.environ.get('FILING_CACHE_MAX_MB', '200')) * 1024 * 1024
+
+# Pipeline 13F: download su thread (rate limit SEC), parse + diff su processi
+HOLDINGS_DOWNLOAD_WORKERS = 4
+HOLDINGS_PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Form 4: dettagli delle transazioni scaricati con un pool limitato e filtrati
+# per codice (P = acquisto, S = vendita a mercato) e controvalore minimo
+FORM4_WORKERS = 4
+FORM4_CODES = set(os.environ.get('FORM4_CODES', 'P,S').split(','))
+FORM4_MIN_VALUE = float(os.environ.get('FORM4_MIN_VALUE', '0'))
+
+# Telegram: ~1 messaggio/s per chat (20/min nei gruppi), ~30/s globali (RATE_LIMITS)
+TELEGRAM_MAX_LENGTH = 4096
+# Errori definitivi: messaggio non valido (400), bot bloccato o escluso dalla chat (403)
+TELEGRAM_REJECTED = {400, 403}
+TELEGRAM_CHAT_RATE = (float(os.environ.get('TELEGRAM_CHAT_RATE', '1')), 3)
+# Da quanti alert dello stesso gruppo in un flush si passa al digest
+DIGEST_THRESHOLD = 5
+
+# Outbox: journal append-only degli alert (pending -> sent), committato dal workflow
+OUTBOX_FILE = 'outbox.jsonl'
+OUTBOX_BATCH = 10          # fsync ogni N record
+OUTBOX_MAX_AGE = 48        # ore: alert non consegnabili da più di così vengono scartati
+OUTBOX_RETENTION = 24      # ore di alert già consegnati tenute nel journal
+
+# Segnali: eventi per ticker di tutte le fonti in una finestra mobile (journal committato)
+SIGNALS_FILE = 'signals.jsonl'
+SIGNAL_WINDOW_DAYS = 7
+SIGNAL_MIN_SCORE = 3.0
+SIGNAL_13F_TOP = 20  # variazioni 13F per tipo che entrano nel motore
+SIGNAL_WEIGHTS = {'insider': 1.0, 'congress': 1.5, '13dg': 2.0, '13f': 1.0}
+SIGNAL_LABELS = {'insider': '👔 Insider', 'congress': '🏛 Politici', '13dg': '🚨 13D/G', '13f': '💼 Fondi 13F'}
+
+# Abbonati: regole per chat (vedi Subscriptions); senza file c'è solo CHAT_ID
+SUBSCRIPTIONS_FILE = os.environ.get('SUBSCRIPTIONS_FILE', 'subscriptions.json')
+ALERT_FORMS = ('congress', '4', 'SC 13D', 'SC 13G', 'SC 13G/A', '13F-HR', 'signal')
+
+# Watermark per form type del feed getcurrent (committata dal workflow)
+CURSORS_FILE = 'edgar_cursors.json'
+EDGAR_MAX_PAGES = 20
+
+# Replay di un archivio di --record: alert che sarebbero partiti (nella directory del replay)
+REPLAY_ALERTS_FILE = 'replay_alerts.jsonl'
+
+# Backfill dai master index EDGAR
+BACKFILL_CHECKPOINT = os.path.join(CACHE_DIR, 'backfill.json')
+BACKFILL_WORKERS = 4
+
+# Daemon: orari EDGAR e intervallo dei checkpoint su disco (secondi)
+EDGAR_TZ = ZoneInfo('America/New_York')
+DAEMON_CHECKPOINT = 60
+DAEMON_COMPACT = 3600  # outbox e journal dei segnali, altrimenti crescono senza limite
+
+# Thread usati per scaricare tutte le fonti in parallelo
+FETCH_WORKERS = 8
+
+# Tabella CUSIP → ticker: CSV locale (cusip,ticker,issuer) compilato in SQLite
+CUSIP_MAP_FILE = 'cusip_map.csv'
+CUSIP_DB_FILE = os.path.join(CACHE_DIR, 'cusip.db')
+
+# Indice CIK dei notevoli, costruito dai file della SEC e rinnovato ogni settimana
+COMPANY_TICKERS_URL = f"{SEC_BASE_URL}/files/company_tickers.json"
+CIK_LOOKUP_URL = f"{SEC_BASE_URL}/Archives/edgar/cik-lookup-data.txt"
+NOTABLE_INDEX_FILE = os.path.join(CACHE_DIR, 'notable_ciks.pickle')
+NOTABLE_INDEX_MAX_AGE = 7 * 86400
+NOTABLE_INDEX_RETRY = 3600
+
 NOTABLE_INVESTORS = [
     # Legendary investors
     'berkshire hathaway', 'warren buffett', 'scion', 'michael burry', 'burry',
@@ -43,17 +200,456 @@ NOTABLE_INVESTORS = [
     'jensen huang', 'nvidia', 'lisa su', 'amd', 'pat gelsinger', 'intel',
     
     # Activist investors
-    'ValueAct', 'jana partners', 'starboard', 'trian', 'nelson peltz',
+    'valueact', 'jana partners', 'starboard', 'trian', 'nelson peltz',
     
     # Crypto & Fintech
     'cathie wood', 'ark invest', 'michael saylor', 'microstrategy',
-    'chamath', 'social capital', 'jack dorsey', 'block',
+    'chamath', 'social capital', 'block',
     
     # Hedge fund legends
-    'renaissance', 'medallion', 'de shaw', 'citadel', 'millennium',
-    'tiger', 'coatue', 'tiger global'
+    'renaissance', 'medallion', 'tiger'
 ]
 
+VIP_POLITICIANS = ['pelosi', 'trump', 'mcconnell', 'schumer', 'biden', 'warren']
+
+class Metrics:
+    """
+    Contatori, gauge e istogrammi thread-safe con etichette, per capire dove va
+    il tempo di una run (throttling SEC, parsing XML, pacing Telegram).
+    Esportati a fine run come testo Prometheus e come JSON.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[self._key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decoratore: durata di ogni chiamata nell'istogramma `name`"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def total(self, name, **labels):
+        """Somma di un contatore su tutte le etichette (filtrata da `labels`)"""
+        with self.lock:
+            return sum(v for (n, l), v in self.counters.items()
+                       if n == name and all(item in l for item in labels.items()))
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"')
+        return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for kind, items in (('counter', self.counters.items()), ('gauge', self.gauges.items())):
+                typed = set()
+                for (name, labels), value in sorted(items):
+                    if name not in typed:
+                        lines.append(f"# TYPE {name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{name}{self._labels(labels)} {value:g}")
+            typed = set()
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in zip(self.buckets, hist['buckets']):
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{self._labels(labels)} {hist['sum']:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {hist['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        with self.lock:
+            flat = lambda name, labels: name + ''.join(f"/{k}={v}" for k, v in labels)
+            return {
+                'counters': {flat(*key): value for key, value in sorted(self.counters.items())},
+                'gauges': {flat(*key): value for key, value in sorted(self.gauges.items())},
+                'histograms': {flat(*key): {'count': h['count'], 'sum': round(h['sum'], 6)}
+                               for key, h in sorted(self.histograms.items())},
+            }
+
+    def export(self, path=METRICS_FILE):
+        """Scrive `path` (testo Prometheus, es. per il textfile collector) e `path`.json"""
+        atomic_write(path, self.to_prometheus().encode())
+        atomic_write(os.path.splitext(path)[0] + '.json', json.dumps(self.to_json(), indent=1).encode())
+
+    def summary(self):
+        """Riga di riepilogo per il log della run"""
+        stages = defaultdict(float)
+        with self.lock:
+            for (name, labels), hist in self.histograms.items():
+                if name == 'insider_stage_seconds':
+                    stages[dict(labels)['stage']] += hist['sum']
+        top = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in
+                        sorted(stages.items(), key=lambda kv: -kv[1])[:5])
+        return (f"{self.total('insider_http_requests_total'):.0f} requests, "
+                f"{self.total('insider_http_retries_total'):.0f} retries, "
+                f"{self.total('insider_sleep_seconds_total'):.1f}s sleeping; {top}")
+
+metrics = Metrics()
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` token al secondo, al massimo `burst` accumulati"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Prenota il token sotto lock e dorme fuori, così i thread si mettono in fila
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def rate_limit(url):
+    """Attende il proprio turno sul bucket dell'host di `url` (se limitato)"""
+    host = urlparse(url).netloc
+    if host not in RATE_LIMITS:
+        return 0
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*RATE_LIMITS[host])
+    wait = bucket.acquire()
+    if wait:
+        metrics.inc('insider_sleep_seconds_total', wait, reason='rate_limit', host=host)
+    return wait
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(url):
+    """Una requests.Session (keep-alive + pool di connessioni) per ogni host"""
+    requests = lazy_import('requests')
+    host = urlparse(url).hostname
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[host] = session
+    return session
+
+def _backoff_delay(attempt):
+    # Full jitter: attesa casuale in [0, base * 2^attempt]
+    return random.uniform(0, min(MAX_RETRY_WAIT, RETRY_BACKOFF * 2 ** attempt))
+
+def _retry_after(response):
+    """Secondi indicati dall'header Retry-After (numero o data HTTP), se presente"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return min(MAX_RETRY_WAIT, max(0, float(value)))
+    except ValueError:
+        pass
+    try:
+        delta = lazy_import('email.utils').parsedate_to_datetime(value).timestamp() - time.time()
+        return min(MAX_RETRY_WAIT, max(0, delta))
+    except (TypeError, ValueError):
+        return None
+
+def _http_cache_paths(url, params):
+    key = url + '?' + json.dumps(params or {}, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    base = os.path.join(HTTP_CACHE_DIR, digest)
+    return base + '.json', base + '.body'
+
+def atomic_write(filepath, data):
+    """Scrive su file temporaneo e poi rinomina: mai file scritti a metà"""
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, filepath)
+
+# Archivio delle risposte (--record) e replay (--replay): None = rete vera
+_recorder = None
+_replay = None
+# Orologio virtuale del replay (epoch): None = tempo reale
+_virtual_time = None
+
+def now(tz=None):
+    """Ora corrente, o quella dell'ultima risposta servita dal replay"""
+    if _virtual_time is None:
+        return datetime.now(tz)
+    return datetime.fromtimestamp(_virtual_time, tz)
+
+def http_request(method, url, conditional=False, retry_on=RETRY_STATUSES, retry_errors=True, **kwargs):
+    """
+    Richiesta HTTP con sessione condivisa, rate limit per host e retry
+    (backoff con jitter, rispetta Retry-After) su errori di rete e `retry_on`;
+    retry_errors=False per le richieste non idempotenti (un timeout in lettura
+    non dice se il server ha già eseguito la richiesta).
+    Con conditional=True invia If-None-Match/If-Modified-Since e, se il server
+    risponde 304, ritorna il body salvato come se fosse un 200.
+    """
+    if _replay is not None:
+        return _replay.response(method, request_url(url, kwargs.get('params')))
+    requests = lazy_import('requests')
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    # In registrazione niente richieste condizionali: l'archivio deve bastare a se stesso
+    conditional = conditional and _recorder is None
+    meta_path = body_path = None
+    validators = {}
+    if conditional:
+        meta_path, body_path = _http_cache_paths(url, kwargs.get('params'))
+        if os.path.exists(body_path):
+            validators = load_json_file(meta_path)
+        headers = dict(kwargs.get('headers') or {})
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        kwargs['headers'] = headers
+
+    session = get_session(url)
+    host = urlparse(url).netloc
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limit(url)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc('insider_http_requests_total', host=host, status=e.__class__.__name__)
+            if attempt == MAX_RETRIES or not retry_errors:
+                raise
+            delay = _backoff_delay(attempt)
+            print(f"   ↻ {method} {urlparse(url).hostname}: {e.__class__.__name__}, retry in {delay:.1f}s")
+            metrics.inc('insider_http_retries_total', host=host)
+            metrics.inc('insider_sleep_seconds_total', delay, reason='retry', host=host)
+            time.sleep(delay)
+            continue
+        metrics.observe('insider_http_request_seconds', time.perf_counter() - started, host=host)
+        metrics.inc('insider_http_requests_total', host=host, status=response.status_code)
+        if response.status_code in retry_on and attempt < MAX_RETRIES:
+            delay = _retry_after(response)
+            if delay is None:
+                delay = _backoff_delay(attempt)
+            print(f"   ↻ {method} {urlparse(url).hostname}: HTTP {response.status_code}, retry in {delay:.1f}s")
+            response.close()
+            metrics.inc('insider_http_retries_total', host=host)
+            metrics.inc('insider_sleep_seconds_total', delay, reason='retry', host=host)
+            time.sleep(delay)
+            continue
+        break
+
+    # In streaming il body non è ancora letto: ci si fida di Content-Length
+    size = int(response.headers.get('Content-Length') or 0) if kwargs.get('stream') else len(response.content)
+    metrics.inc('insider_http_response_bytes_total', size, host=host)
+
+    if conditional:
+        if response.status_code == 304 and validators:
+            with open(body_path, 'rb') as f:
+                response._content = f.read()
+            response.status_code = 200
+            response.from_cache = True
+            metrics.inc('insider_http_cache_hits_total', host=host)
+        elif response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                atomic_write(body_path, response.content)
+                atomic_write(meta_path, json.dumps({
+                    'url': url, 'etag': etag, 'last_modified': last_modified
+                }).encode())
+    if _recorder is not None and not url.startswith(f"{TELEGRAM_API_URL}/bot"):
+        _recorder.record(method, request_url(url, kwargs.get('params')), response)
+    return response
+
+def http_get(url, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+def request_url(url, params=None):
+    """URL completo di query string, chiave delle risposte nell'archivio"""
+    if not params:
+        return url
+    prepared = lazy_import('requests').models.PreparedRequest()
+    prepared.prepare_url(url, params)
+    return prepared.url
+
+class ResponseRecorder:
+    """
+    Archivio delle risposte dei fetcher: JSONL compresso con gzip, un membro per
+    run (più registrazioni si accodano allo stesso file). Ogni run apre con
+    {'type': 'run', 'ts'} ed è seguito dalle sue risposte con timestamp, status,
+    header e body (già decodificato) in base64.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.count = 0
+        self._write({'type': 'run', 'ts': time.time()})
+
+    def _write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+
+    def record(self, method, url, response):
+        # In streaming il body si legge qui: iter_content/iter_lines lo riusano dalla memoria
+        body = response.content
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() not in ('content-encoding', 'transfer-encoding', 'content-length')}
+        self._write({'type': 'response', 'ts': time.time(), 'method': method, 'url': url,
+                     'status': response.status_code, 'headers': headers,
+                     'body': lazy_import('base64').b64encode(body).decode('ascii')})
+        self.count += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def iter_archive_runs(path):
+    """(timestamp, risposte) per ogni run dell'archivio, un run alla volta in memoria"""
+    run = None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                record = json.loads(line)
+                if record['type'] == 'run':
+                    if run:
+                        yield run
+                    run = (record['ts'], [])
+                elif run:
+                    run[1].append(record)
+        except (EOFError, OSError, json.JSONDecodeError) as e:
+            # Coda troncata da un run interrotto: si rigioca quello che c'è
+            print(f"   ⚠️ Archive truncated ({e.__class__.__name__}), replaying what was read")
+    if run:
+        yield run
+
+class ResponseReplay:
+    """
+    Serve le risposte di un archivio al posto della rete, un run alla volta: per
+    ogni URL quelle del run nell'ordine registrato, poi l'ultima vista in un run
+    precedente, altrimenti 404. L'orologio virtuale segue il timestamp delle
+    risposte servite; i messaggi Telegram finiscono in un file JSONL.
+    """
+
+    def __init__(self, alerts_path):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.latest = {}
+        self.alerts = open(alerts_path, 'a')
+        self.served = self.missing = self.bytes = self.sent = 0
+
+    def start_run(self, ts, records):
+        global _virtual_time
+        with self.lock:
+            for queue in self.pending.values():
+                for record in queue:
+                    self.latest[(record['method'], record['url'])] = record
+            self.pending = defaultdict(list)
+            for record in reversed(records):
+                self.pending[(record['method'], record['url'])].append(record)
+            _virtual_time = ts
+
+    def response(self, method, url):
+        global _virtual_time
+        requests = lazy_import('requests')
+        key = (method, url)
+        with self.lock:
+            queue = self.pending.get(key)
+            record = queue.pop() if queue else self.latest.get(key)
+            if record is None:
+                self.missing += 1
+            else:
+                self.latest[key] = record
+                self.served += 1
+                _virtual_time = max(_virtual_time or 0, record['ts'])
+        response = requests.models.Response()
+        response.url = url
+        if record is None:
+            response.status_code = 404
+            response._content = b'Not in archive'
+        else:
+            response.status_code = record['status']
+            response.headers = requests.structures.CaseInsensitiveDict(record['headers'])
+            response._content = lazy_import('base64').b64decode(record['body'])
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.headers['Content-Length'] = str(len(response._content))
+        # Body già in memoria: iter_content/iter_lines lo riusano, raw per chi legge a mano
+        response._content_consumed = True
+        response.raw = io.BytesIO(response._content)
+        with self.lock:
+            self.bytes += len(response._content)
+        return response
+
+    def deliver(self, chat_id, message):
+        """Sink Telegram finto: il messaggio viene solo registrato"""
+        with self.lock:
+            self.alerts.write(json.dumps({'ts': _virtual_time, 'chat_id': chat_id, 'text': message},
+                                         ensure_ascii=False) + '\n')
+            self.sent += 1
+        return 'sent'
+
+    def close(self):
+        self.alerts.close()
+
 def load_json_file(filepath):
     try:
         with open(filepath, 'r') as f:
@@ -61,44 +657,603 @@ def load_json_file(filepath):
     except:
         return {}
 
+def load_pickle_file(filepath):
+    """Snapshot binario scritto da noi (indici precalcolati): niente parsing all'avvio"""
+    try:
+        with open(filepath, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return {}
+
 def save_json_file(filepath, data):
     with open(filepath, 'w') as f:
         json.dump(data, f)
 
-def load_seen():
-    data = load_json_file(SEEN_FILE)
-    if isinstance(data, list):
-        return set(data)
-    return set(data.get('seen', []) if isinstance(data, dict) else [])
+def _seen_hash(item):
+    """Hash a 64 bit di un ID (URL SEC, trade id...): 8 byte al posto di ~100"""
+    return int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'little')
 
-def save_seen(seen):
-    save_json_file(SEEN_FILE, {'seen': list(seen)})
+class BloomFilter:
+    """Bloom filter su hash a 64 bit (double hashing), serializzabile su file"""
 
-def send_telegram(message):
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+    HEADER = struct.Struct('<16sII')
+
+    def __init__(self, bits, hashes, data=None, generation=b''):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = data if data is not None else bytearray((bits + 7) // 8)
+        self.generation = generation
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01, generation=b''):
+        capacity = max(capacity, 1000)
+        bits = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        return cls(bits, hashes, generation=generation)
+
+    def _positions(self, h):
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, h):
+        for pos in self._positions(h):
+            self.data[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, h):
+        return all(self.data[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(h))
+
+    def save(self, filepath):
+        atomic_write(filepath, self.HEADER.pack(self.generation, self.bits, self.hashes) + bytes(self.data))
+
+    @classmethod
+    def load(cls, filepath):
+        try:
+            with open(filepath, 'rb') as f:
+                generation, bits, hashes = cls.HEADER.unpack(f.read(cls.HEADER.size))
+                data = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+        if len(data) != (bits + 7) // 8:
+            return None
+        return cls(bits, hashes, data, generation)
+
+class HashLogSeenStore:
+    """
+    Store degli ID già visti, compatto e append-only:
+    - seen.idx: record (hash, timestamp) a larghezza fissa ordinati per hash,
+      letti via mmap con ricerca binaria (nessun parsing all'avvio)
+    - seen.log: record aggiunti dopo l'ultima compattazione, solo in append
+    - bloom (in .cache, ricostruibile) davanti a seen.idx: un "no" è definitivo
+    La compattazione fonde log e indice e scarta i record più vecchi di
+    SEEN_RETENTION_DAYS.
+    """
+
+    RECORD = struct.Struct('<QI')
+    GENERATION_SIZE = 16
+
+    def __init__(self, index_path=SEEN_INDEX_FILE, log_path=SEEN_LOG_FILE,
+                 bloom_path=SEEN_BLOOM_FILE, use_bloom=SEEN_USE_BLOOM):
+        self.index_path = index_path
+        self.log_path = log_path
+        self.bloom_path = bloom_path
+        self.use_bloom = use_bloom
+        self.tail = {}
+        self.pending = []
+        self.lock = threading.Lock()
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % self.RECORD.size  # ignora un record troncato
+            for h, ts in self.RECORD.iter_unpack(data[:usable]):
+                self.tail[h] = ts
+        self._open_index()
+
+    def _open_index(self):
+        self.generation = b''
+        self.index = None
+        self.index_count = 0
+        self.bloom = None
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) <= self.GENERATION_SIZE:
+            return
+        with open(self.index_path, 'rb') as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.generation = self.index[:self.GENERATION_SIZE]
+        self.index_count = (len(self.index) - self.GENERATION_SIZE) // self.RECORD.size
+        if self.use_bloom:
+            bloom = BloomFilter.load(self.bloom_path)
+            # Un bloom di un'altra generazione dell'indice darebbe falsi "nuovo"
+            if bloom is None or bloom.generation != self.generation:
+                bloom = self._build_bloom()
+            self.bloom = bloom
+
+    def _build_bloom(self):
+        bloom = BloomFilter.for_capacity(self.index_count, generation=self.generation)
+        for h, _ in self._iter_index():
+            bloom.add(h)
+        bloom.save(self.bloom_path)
+        return bloom
+
+    def _iter_index(self):
+        if self.index is None:
+            return iter(())
+        return self.RECORD.iter_unpack(self.index[self.GENERATION_SIZE:])
+
+    def _index_contains(self, h):
+        lo, hi = 0, self.index_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = self.RECORD.unpack_from(self.index, self.GENERATION_SIZE + mid * self.RECORD.size)[0]
+            if key == h:
+                return True
+            if key < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+    def __contains__(self, item):
+        h = _seen_hash(item)
+        with self.lock:
+            if h in self.tail:
+                return True
+        if self.index is None:
+            return False
+        if self.bloom is not None and h not in self.bloom:
+            return False
+        return self._index_contains(h)
+
+    def __len__(self):
+        return self.index_count + len(self.tail)
+
+    def add(self, item):
+        h = _seen_hash(item)
+        with self.lock:
+            if h in self.tail:
+                return
+            ts = int(time.time())
+            self.tail[h] = ts
+            self.pending.append(self.RECORD.pack(h, ts))
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def flush(self):
+        """Accoda al log i record nuovi; compatta se il log è grande o l'indice vecchio"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if pending:
+            with open(self.log_path, 'ab') as f:
+                f.write(b''.join(pending))
+        index_age = time.time() - os.path.getmtime(self.index_path) if self.index is not None else 0
+        if len(self.tail) >= SEEN_COMPACT_THRESHOLD or index_age > 86400:
+            self.compact()
+
+    def compact(self):
+        """Fonde log e indice, scarta i record scaduti e riscrive l'indice ordinato"""
+        cutoff = time.time() - SEEN_RETENTION_DAYS * 86400
+        with self.lock:
+            merged = {h: ts for h, ts in self._iter_index()}
+            merged.update(self.tail)
+            records = sorted((h, ts) for h, ts in merged.items() if ts >= cutoff)
+            data = bytearray(os.urandom(self.GENERATION_SIZE))
+            for h, ts in records:
+                data += self.RECORD.pack(h, ts)
+            if self.index is not None:
+                self.index.close()
+            atomic_write(self.index_path, bytes(data))
+            # Se crasha qui il log contiene record già nell'indice: innocuo
+            atomic_write(self.log_path, b'')
+            self.tail = {}
+            self.pending = []
+            self._open_index()
+
+    def close(self):
+        self.flush()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+class SqliteSeenStore:
+    """Stessa interfaccia di HashLogSeenStore su SQLite (comodo in locale/daemon)"""
+
+    def __init__(self, db_path=SEEN_DB_FILE):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen (h INTEGER PRIMARY KEY, ts INTEGER NOT NULL) WITHOUT ROWID')
+        self.lock = threading.Lock()
+
+    def __contains__(self, item):
+        with self.lock:
+            row = self.db.execute('SELECT 1 FROM seen WHERE h = ?', (self._key(item),)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    @staticmethod
+    def _key(item):
+        # SQLite vuole interi con segno a 64 bit
+        h = _seen_hash(item)
+        return h - (1 << 64) if h >= 1 << 63 else h
+
+    def add(self, item):
+        with self.lock:
+            self.db.execute('INSERT OR IGNORE INTO seen VALUES (?, ?)', (self._key(item), int(time.time())))
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def flush(self):
+        cutoff = int(time.time() - SEEN_RETENTION_DAYS * 86400)
+        with self.lock:
+            self.db.execute('DELETE FROM seen WHERE ts < ?', (cutoff,))
+            self.db.commit()
+
+    def compact(self):
+        self.flush()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+SEEN_BACKENDS = {
+    'log': HashLogSeenStore,
+    'sqlite': SqliteSeenStore,
+}
+
+def open_seen_store(backend=SEEN_BACKEND):
+    """Apre lo store degli ID visti; al primo avvio importa il vecchio seen_transactions.json"""
+    store = SEEN_BACKENDS[backend]()
+    if len(store) == 0 and os.path.exists(SEEN_FILE):
+        data = load_json_file(SEEN_FILE)
+        legacy = data if isinstance(data, list) else data.get('seen', []) if isinstance(data, dict) else []
+        store.update(legacy)
+        store.compact()
+        print(f"   ✓ Migrated {len(legacy)} items from {SEEN_FILE}")
+    return store
+
+def split_message(text, limit=TELEGRAM_MAX_LENGTH):
+    """
+    Divide un messaggio HTML in parti <= limit sui confini di riga; una riga
+    troppo lunga si taglia sull'ultimo spazio fuori dai tag, chiudendo i tag
+    aperti (es. <b>) alla fine della parte e riaprendoli nella successiva.
+    """
+    parts, current = [], ''
+    for line in text.split('\n'):
+        while len(line) > limit:
+            head, line = _cut_line(line, limit)
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(head)
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current.strip():
+        parts.append(current)
+    return parts
+
+def _closing_tag(tag):
+    return '</' + re.match(r'<(\w+)', tag).group(1) + '>'
+
+def _cut_line(line, limit):
+    """
+    (prima parte chiusa, resto con i tag riaperti) di una riga più lunga di limit.
+    Tag ed entità (&amp;) sono indivisibili; senza spazi si taglia il più avanti possibile.
+    """
+    stack, i = [], 0
+    cut, cut_stack = 0, []
+    hard, hard_stack = 0, []
+    while i < len(line):
+        if line[i] in '<&':
+            end = line.find('>' if line[i] == '<' else ';', i)
+            end = len(line) - 1 if end < 0 else end
+        else:
+            end = i
+        token = line[i:end + 1]
+        opened = stack + [token] if line[i] == '<' and not token.startswith('</') else stack
+        if end + 1 + sum(len(_closing_tag(t)) for t in opened) > limit:
+            break
+        if token == ' ':
+            cut, cut_stack = i, list(stack)
+        if line[i] == '<':
+            if token.startswith('</'):
+                if stack:
+                    stack.pop()
+            elif not token.endswith('/>'):
+                stack.append(token)
+        i = end + 1
+        hard, hard_stack = i, list(stack)
+    if not cut:
+        cut, cut_stack = hard, hard_stack
+    if not cut:
+        return line[:limit], line[limit:]  # un tag più lungo del limite: taglio secco
+    head = line[:cut] + ''.join(_closing_tag(t) for t in reversed(cut_stack))
+    return head, ''.join(cut_stack) + line[cut:].lstrip(' ')
+
+_chat_buckets = {}
+
+@metrics.timed('insider_stage_seconds', stage='telegram_send')
+def deliver_telegram(chat_id, message):
+    """
+    Invia un messaggio (diviso se serve) rispettando il limite per chat e quello
+    globale; su 429 aspetta il retry_after indicato da Telegram e riprova.
+    Ritorna 'sent', 'failed' (errore temporaneo, si riprova) o 'rejected'
+    (TELEGRAM_REJECTED: il messaggio non passerà mai così com'è).
+    """
+    if _replay is not None:
+        return _replay.deliver(chat_id, message)
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}/sendMessage"
+    with _buckets_lock:
+        bucket = _chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = _chat_buckets[chat_id] = TokenBucket(*TELEGRAM_CHAT_RATE)
     try:
-        # Split long messages
-        if len(message) > 4096:
-            parts = [message[i:i+4000] for i in range(0, len(message), 4000)]
-            for part in parts:
-                requests.post(url, json={
-                    'chat_id': CHAT_ID,
+        for part in split_message(message):
+            for attempt in range(MAX_RETRIES + 1):
+                wait = bucket.acquire()
+                if wait:
+                    metrics.inc('insider_sleep_seconds_total', wait, reason='telegram_pacing')
+                # Nessun retry automatico: un 5xx o un timeout su POST potrebbe aver già consegnato il messaggio
+                response = http_request('POST', url, retry_on=set(), retry_errors=False, json={
+                    'chat_id': chat_id,
                     'text': part,
                     'parse_mode': 'HTML',
                     'disable_web_page_preview': True
-                }, timeout=REQUEST_TIMEOUT)
-                time.sleep(0.5)
-        else:
-            requests.post(url, json={
-                'chat_id': CHAT_ID,
-                'text': message,
-                'parse_mode': 'HTML',
-                'disable_web_page_preview': True
-            }, timeout=REQUEST_TIMEOUT)
-        return True
+                })
+                if response.status_code != 429 or attempt == MAX_RETRIES:
+                    break
+                try:
+                    retry_after = response.json()['parameters']['retry_after']
+                except (ValueError, KeyError, TypeError):
+                    retry_after = _retry_after(response) or _backoff_delay(attempt)
+                print(f"   ↻ Telegram 429, retry in {retry_after}s")
+                metrics.inc('insider_sleep_seconds_total', retry_after, reason='telegram_429')
+                time.sleep(retry_after)
+            if not response.ok:
+                print(f"Telegram error: HTTP {response.status_code} {response.text[:200]}")
+                status = 'rejected' if response.status_code in TELEGRAM_REJECTED else 'failed'
+                metrics.inc('insider_telegram_messages_total', status=status)
+                return status
+        metrics.inc('insider_telegram_messages_total', status='sent')
+        return 'sent'
     except Exception as e:
         print(f"Telegram error: {e}")
-        return False
+        metrics.inc('insider_telegram_messages_total', status='failed')
+        return 'failed'
+
+def send_telegram(message):
+    return deliver_telegram(CHAT_ID, message) == 'sent'
+
+class Outbox:
+    """
+    Journal append-only (JSONL) degli alert in uscita. Ogni alert entra come
+    'put' con la sua chiave di dedup e passa a 'sent' (o 'drop' dopo troppi
+    tentativi): dopo un crash, al run successivo si riparte dai pending.
+    """
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self.entries = {}
+        # Pending indicizzati per chat: un flush guarda solo le sue voci, non tutto il journal
+        self.pending_by_chat = defaultdict(dict)
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # riga troncata da un crash a metà scrittura
+                    self._apply(record)
+        self.file = open(path, 'a')
+
+    def _apply(self, record):
+        op = record.get('op')
+        if op == 'put':
+            if record['key'] not in self.entries:
+                entry = self.entries[record['key']] = {**record, 'status': 'pending', 'attempts': 0}
+                self.pending_by_chat[entry['chat_id']][entry['key']] = entry
+        elif record.get('key') in self.entries:
+            entry = self.entries[record['key']]
+            if op == 'sent':
+                entry['status'] = 'sent'
+                entry['sent_at'] = record.get('ts')
+            elif op == 'fail':
+                entry['attempts'] += 1
+            elif op == 'drop':
+                entry['status'] = 'dropped'
+            if entry['status'] != 'pending':
+                chat = self.pending_by_chat.get(entry['chat_id'])
+                if chat is not None:
+                    chat.pop(entry['key'], None)
+                    if not chat:
+                        del self.pending_by_chat[entry['chat_id']]
+
+    def _append(self, record):
+        self._apply(record)
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= OUTBOX_BATCH:
+            self.sync()
+
+    def sync(self):
+        """fsync del journal: da qui in poi i record sopravvivono anche a un crash della macchina"""
+        with self.lock:
+            if self.unsynced:
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def put(self, key, chat_id, text, group=None):
+        """Registra un alert pending; False se la chiave è già nel journal (idempotente)"""
+        if key in self.entries:
+            return False
+        self._append({'op': 'put', 'key': key, 'chat_id': chat_id, 'text': text,
+                      'group': group, 'ts': int(time.time())})
+        return True
+
+    def pending(self, chat_id=None):
+        if chat_id is not None:
+            return list(self.pending_by_chat.get(chat_id, {}).values())
+        return [e for chat in self.pending_by_chat.values() for e in chat.values()]
+
+    def pending_chats(self):
+        return list(self.pending_by_chat)
+
+    def mark_sent(self, key):
+        self._append({'op': 'sent', 'key': key, 'ts': int(time.time())})
+
+    def mark_failed(self, key):
+        self._append({'op': 'fail', 'key': key, 'ts': int(time.time())})
+
+    def mark_rejected(self, key):
+        print(f"   ✗ Dropping alert {key}: rejected by Telegram")
+        self._append({'op': 'drop', 'key': key, 'ts': int(time.time())})
+
+    def expire(self, max_age=OUTBOX_MAX_AGE):
+        """Scarta gli alert falliti ancora pending dopo max_age ore; ritorna quanti"""
+        cutoff = time.time() - max_age * 3600
+        expired = [e['key'] for e in self.pending() if e['attempts'] and e['ts'] < cutoff]
+        for key in expired:
+            print(f"   ✗ Dropping alert {key}: undelivered for {max_age}h")
+            self._append({'op': 'drop', 'key': key, 'ts': int(time.time())})
+        return len(expired)
+
+    def compact(self):
+        """Riscrive il journal con i pending e gli alert chiusi nelle ultime OUTBOX_RETENTION ore"""
+        cutoff = time.time() - OUTBOX_RETENTION * 3600
+        keep = [e for e in self.entries.values()
+                if e['status'] == 'pending' or (e.get('sent_at') or e['ts']) >= cutoff]
+        lines = []
+        for entry in keep:
+            lines.append({'op': 'put', **{k: entry[k] for k in ('key', 'chat_id', 'text', 'group', 'ts')}})
+            lines.extend({'op': 'fail', 'key': entry['key']} for _ in range(entry['attempts']))
+            if entry['status'] != 'pending':
+                lines.append({'op': 'sent' if entry['status'] == 'sent' else 'drop',
+                              'key': entry['key'], 'ts': entry.get('sent_at') or entry['ts']})
+        # Prima il nuovo journal: se la scrittura fallisce resta valido (e aperto) quello vecchio
+        atomic_write(self.path, ''.join(json.dumps(l, ensure_ascii=False) + '\n' for l in lines).encode())
+        self.file.close()
+        self.entries = {}
+        self.pending_by_chat = defaultdict(dict)
+        for line in lines:
+            self._apply(line)
+        self.file = open(self.path, 'a')
+
+    def close(self):
+        self.sync()
+        self.compact()
+        self.file.close()
+
+class TelegramQueue:
+    """
+    Coda di invio sopra l'Outbox: put() registra l'alert nel journal, flush()
+    consegna tutti i pending (anche quelli rimasti da run precedenti).
+    I gruppi con almeno DIGEST_THRESHOLD alert nello stesso flush vengono uniti
+    in messaggi digest; on_sent(ok) viene chiamato per ogni alert di questo run.
+    """
+
+    def __init__(self, outbox, chat_id=None, digest_threshold=DIGEST_THRESHOLD):
+        self.outbox = outbox
+        self.chat_id = chat_id or CHAT_ID
+        self.digest_threshold = digest_threshold
+        self.callbacks = {}
+        self.failed = set()
+
+    def __len__(self):
+        return len(self.outbox.pending(self.chat_id))
+
+    def put(self, text, group=None, key=None, on_sent=None):
+        """Accoda un alert; una `key` già presente nel journal viene ignorata"""
+        key = key or hashlib.sha1(text.encode()).hexdigest()
+        if not self.outbox.put(key, self.chat_id, text, group):
+            return False
+        if on_sent:
+            self.callbacks[key] = on_sent
+        return True
+
+    def _coalesce(self, entries):
+        by_group = defaultdict(list)
+        for entry in entries:
+            by_group[entry['group']].append(entry)
+        messages, emitted = [], set()
+        for entry in entries:
+            group = entry['group']
+            if group is None or len(by_group[group]) < self.digest_threshold:
+                messages.append((entry['text'], [entry['key']]))
+            elif group not in emitted:
+                # Il digest prende il posto del primo alert del gruppo
+                emitted.add(group)
+                messages.extend(self._digest(group, by_group[group]))
+        return messages
+
+    def _digest(self, group, entries):
+        separator = "\n\n➖➖➖➖➖\n\n"
+        chunks, texts, keys = [], [], []
+        for entry in entries:
+            size = sum(len(t) + len(separator) for t in texts) + len(entry['text']) + 100
+            if texts and size > TELEGRAM_MAX_LENGTH:
+                chunks.append((texts, keys))
+                texts, keys = [], []
+            texts.append(entry['text'])
+            keys.append(entry['key'])
+        chunks.append((texts, keys))
+        messages = []
+        for n, (texts, keys) in enumerate(chunks, 1):
+            part = f" ({n}/{len(chunks)})" if len(chunks) > 1 else ""
+            messages.append((f"📦 <b>DIGEST {group}</b> - {len(texts)} alert{part}\n\n" + separator.join(texts), keys))
+        return messages
+
+    def flush(self, retry=False):
+        """
+        Consegna i pending della chat, ritorna il numero di alert consegnati.
+        Un alert fallito non si ritenta nei flush successivi della stessa coda
+        (un run fa molti flush) ma solo con retry=True, cioè da BotState.resume().
+        """
+        delivered = 0
+        if retry:
+            self.failed.clear()
+        pending = [e for e in self.outbox.pending(self.chat_id) if e['key'] not in self.failed]
+        metrics.set('insider_queue_depth', len(pending), chat=self.chat_id)
+        for text, keys in self._coalesce(pending):
+            status = deliver_telegram(self.chat_id, text)
+            if status == 'rejected' and len(keys) > 1:
+                # Il 400 di un digest può dipendere da un solo alert: si ritentano uno
+                # per uno e si scarta solo quello che Telegram rifiuta anche da solo
+                for key in keys:
+                    delivered += self._settle(key, deliver_telegram(self.chat_id, self.outbox.entries[key]['text']))
+                continue
+            for key in keys:
+                delivered += self._settle(key, status)
+        self.outbox.sync()
+        metrics.set('insider_queue_depth', len(self.outbox.pending(self.chat_id)), chat=self.chat_id)
+        return delivered
+
+    def _settle(self, key, status):
+        """Registra l'esito di un alert nel journal, ritorna 1 se consegnato"""
+        ok = status == 'sent'
+        if ok:
+            self.outbox.mark_sent(key)
+        elif status == 'rejected':
+            self.outbox.mark_rejected(key)
+        else:
+            self.outbox.mark_failed(key)
+            self.failed.add(key)
+        on_sent = self.callbacks.pop(key, None)
+        if on_sent:
+            on_sent(ok)
+        return int(ok)
 
 def format_number(num):
     """Formatta numeri grandi"""
@@ -126,6 +1281,11 @@ def parse_amount_range(amount_str):
     }
     return ranges.get(amount_str, amount_str)
 
+def amount_lower_bound(amount_str):
+    """Estremo inferiore di una fascia '$1,001 - $15,000' (o 'Over $50,000,000'), o None"""
+    match = re.search(r'\$([\d,]+)', str(amount_str))
+    return float(match.group(1).replace(',', '')) if match else None
+
 def extract_ticker_from_title(title):
     match = re.search(r'\(([A-Z]{1,5})\)', title)
     return match.group(1) if match else None
@@ -134,149 +1294,916 @@ def extract_company_from_title(title):
     title = re.sub(r'^(3|4|5|SC 13[DG](/A)?|13F-HR)\s*-\s*', '', title)
     return title.split('(')[0].strip()
 
+def compile_watchlist(names):
+    """
+    Compila una watchlist in un'unica regex: nomi normalizzati (minuscolo, spazi
+    singoli) e senza duplicati, fattorizzati in un trie così ogni posizione del
+    testo viene esaminata una volta sola, con word boundary ai due lati
+    ('amd' non matcha dentro 'amdocs').
+    """
+    trie = {}
+    for name in dict.fromkeys(' '.join(n.lower().split()) for n in names if n.strip()):
+        node = trie
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = [(r'\s+' if ch == ' ' else re.escape(ch)) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Quantificatore greedy: vince il nome più lungo ('tiger global' su 'tiger')
+        return f'(?:{body})?' if '' in node else body
+
+    return re.compile(r'\b' + build(trie) + r'\b', re.IGNORECASE)
+
+# Compilate al primo match: con l'indice CIK la regex dei notevoli serve di rado
+@functools.lru_cache(maxsize=None)
+def notable_pattern():
+    return compile_watchlist(NOTABLE_INVESTORS)
+
+@functools.lru_cache(maxsize=None)
+def vip_pattern():
+    return compile_watchlist(VIP_POLITICIANS)
+
+def match_watchlist(pattern, text):
+    """Nome della watchlist trovato in `text` (normalizzato), o None"""
+    match = pattern.search(text or '')
+    return ' '.join(match.group(0).lower().split()) if match else None
+
+def match_notable(title):
+    return match_watchlist(notable_pattern(), title)
+
 def is_notable_investor(title):
-    title_lower = title.lower()
-    return any(name in title_lower for name in NOTABLE_INVESTORS)
+    return match_notable(title) is not None
+
+def build_notable_index():
+    """
+    Applica la watchlist una volta sola ai file CIK della SEC (company_tickers.json
+    per le società quotate, cik-lookup-data.txt per fondi e persone fisiche):
+    ({cik a 10 cifre: nome della watchlist}, {cik a 10 cifre: ticker})
+    """
+    ciks, tickers = {}, {}
+    response = http_get(COMPANY_TICKERS_URL, headers=HEADERS)
+    response.raise_for_status()
+    for company in response.json().values():
+        cik = f"{int(company['cik_str']):010d}"
+        # Il primo ticker elencato è la classe principale
+        tickers.setdefault(cik, company['ticker'])
+        name = match_notable(company['title'])
+        if name:
+            ciks[cik] = name
+    # ~1M righe 'NOME:CIK:', lette in streaming
+    response = http_get(CIK_LOOKUP_URL, headers=HEADERS, stream=True)
+    response.raise_for_status()
+    with response:
+        for line in response.iter_lines():
+            entity, _, cik = line.decode('latin-1').rstrip(':').rpartition(':')
+            name = match_notable(entity) if cik.isdigit() else None
+            if name:
+                ciks.setdefault(f"{int(cik):010d}", name)
+    return ciks, tickers
+
+_notable_lock = threading.Lock()
+_notable_index = None
+
+def get_notable_index():
+    """
+    Indice CIK dei notevoli, ricostruito quando è più vecchio di NOTABLE_INDEX_MAX_AGE
+    o quando la watchlist cambia. Vuoto se non è mai stato possibile costruirlo.
+    """
+    global _notable_index
+    watchlist = hashlib.sha256('\n'.join(NOTABLE_INVESTORS).encode()).hexdigest()[:16]
+    with _notable_lock:
+        if _notable_index is not None and time.time() - _notable_index['built'] < NOTABLE_INDEX_MAX_AGE:
+            return _notable_index['ciks']
+        data = load_pickle_file(NOTABLE_INDEX_FILE)
+        if (data.get('watchlist') != watchlist or 'tickers' not in data
+                or time.time() - data.get('built', 0) >= NOTABLE_INDEX_MAX_AGE):
+            print("📇 Building notable CIK index...")
+            try:
+                ciks, tickers = build_notable_index()
+                data = {'built': time.time(), 'watchlist': watchlist, 'ciks': ciks, 'tickers': tickers}
+                atomic_write(NOTABLE_INDEX_FILE, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+                print(f"   ✓ {len(data['ciks'])} notable CIKs\n")
+            except Exception as e:
+                print(f"   ✗ CIK index refresh failed: {e}\n")
+                # Si tiene l'indice vecchio (se è della stessa watchlist) e si riprova più tardi
+                ciks = data.get('ciks', {}) if data.get('watchlist') == watchlist else {}
+                data = {'built': time.time() - NOTABLE_INDEX_MAX_AGE + NOTABLE_INDEX_RETRY,
+                        'watchlist': watchlist, 'ciks': ciks, 'tickers': data.get('tickers', {})}
+        _notable_index = data
+        return data['ciks']
+
+def filing_cik(filing):
+    """
+    CIK a 10 cifre dell'entry: quello tra parentesi nel titolo Atom (Issuer e Reporting
+    dello stesso Form 4 condividono il link), altrimenti la cartella EDGAR del link
+    """
+    m = (re.search(r'\((\d{10})\)', filing.get('title', ''))
+         or re.search(r'/Archives/edgar/data/(\d+)/', filing.get('link', '')))
+    return f"{int(m.group(1)):010d}" if m else None
+
+def lookup_notable(cik, name):
+    """Lookup O(1) del CIK nell'indice; match sul nome solo se l'indice non è disponibile"""
+    index = get_notable_index()
+    if index:
+        return index.get(cik)
+    return match_notable(name)
+
+def notable_name(filing):
+    return lookup_notable(filing_cik(filing), filing['title'])
+
+def is_notable_filing(filing):
+    return notable_name(filing) is not None
+
+def cik_ticker(cik):
+    """Ticker della società quotata con quel CIK (da company_tickers.json), o None"""
+    get_notable_index()
+    return _notable_index.get('tickers', {}).get(cik)
 
 def is_tax_payment(trade):
     comment = str(trade.get('comment', '')).lower()
     return any(kw in comment for kw in ['tax', 'withholding', 'tax obligation'])
 
-def check_congressional_trades():
+def iter_json_array(f, chunk_size=65536):
+    """Itera gli elementi di un array JSON da file senza caricarlo tutto in memoria"""
+    ijson = lazy_import('ijson', optional=True)
+    if ijson is not None:
+        yield from ijson.items(f, 'item', use_float=True)
+        return
+    decoder = json.JSONDecoder()
+    skip = re.compile(r'[\s,]*')
+    reader = codecs.getreader('utf-8')(f)
+    buf = reader.read(chunk_size).lstrip()
+    if not buf.startswith('['):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    eof = False
+    while True:
+        pos = skip.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+            # Un oggetto che arriva a fine buffer potrebbe essere troncato
+            if end < len(buf) or eof:
+                yield obj
+                pos = end
+                continue
+        except json.JSONDecodeError:
+            if eof:
+                raise
+        chunk = reader.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+def _splice_tail(path, start, response):
+    """
+    Se i primi byte della risposta Range coincidono con la coda dello snapshot,
+    riscrive lo snapshot come prefisso locale + coda scaricata. Ritorna True se ok.
+    """
+    size = os.path.getsize(path)
+    chunks = response.iter_content(65536)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size - start:
+            break
+    with open(path, 'rb') as f:
+        f.seek(start)
+        expected = f.read(size - TAIL_SLACK - start)
+    if head[:len(expected)] != expected:
+        return False
+    tmp = path + '.tmp'
+    with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+        remaining = start
+        while remaining:
+            block = src.read(min(remaining, 1 << 20))
+            if not block:
+                return False
+            dst.write(block)
+            remaining -= len(block)
+        dst.write(head)
+        for chunk in chunks:
+            dst.write(chunk)
+    os.replace(tmp, path)
+    return True
+
+def sync_stock_watcher(name, url):
+    """
+    Allinea lo snapshot locale di un all_transactions.json su S3.
+    - oggetto invariato (304): nessun download
+    - oggetto solo cresciuto: scarica solo la coda con una richiesta Range
+    - altrimenti: download completo in streaming su disco
+    Ritorna (path dello snapshot, True se è cambiato).
+    """
+    path = os.path.join(STOCK_WATCHER_DIR, f"{name}.json")
+    meta_path = path + '.meta'
+    # In registrazione sempre il download completo (vedi http_request)
+    meta = load_json_file(meta_path) if os.path.exists(path) and _recorder is None else {}
+    os.makedirs(STOCK_WATCHER_DIR, exist_ok=True)
+
+    # S3 non comprime al volo, ma con Range vogliamo offset sui byte reali
+    headers = {'Accept-Encoding': 'identity'}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    elif meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    start = meta.get('length', 0) - TAIL_OVERLAP
+    if start > 0:
+        headers['Range'] = f"bytes={start}-"
+
+    response = http_get(url, headers=headers, stream=True)
+    if response.status_code == 304:
+        response.close()
+        return path, False
+
+    spliced = False
+    if response.status_code == 206:
+        total = int(response.headers.get('Content-Range', '/0').rsplit('/', 1)[-1] or 0)
+        if total > meta['length']:
+            spliced = _splice_tail(path, start, response)
+        response.close()
+        if not spliced:
+            response = http_get(url, headers={'Accept-Encoding': 'identity'}, stream=True)
+    elif 'Range' in headers and response.status_code != 200:
+        # Es. 416: l'oggetto si è accorciato sotto l'offset, si riscarica tutto senza condizioni
+        response.close()
+        response = http_get(url, headers={'Accept-Encoding': 'identity'}, stream=True)
+
+    if not spliced:
+        response.raise_for_status()
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            for chunk in response.iter_content(65536):
+                f.write(chunk)
+        os.replace(tmp, path)
+
+    save_json_file(meta_path, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'length': os.path.getsize(path)
+    })
+    response.close()
+    return path, True
+
+def load_recent_trades(name, url, days=7, changed_only=False):
+    """
+    Trades con disclosure_date negli ultimi `days` giorni, parsati in streaming.
+    Con changed_only=True ritorna None se l'oggetto su S3 non è cambiato.
+    """
+    cutoff = (now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    path, changed = sync_stock_watcher(name, url)
+    if changed_only and not changed:
+        return None
+    recent_path = os.path.join(STOCK_WATCHER_DIR, f"{name}.recent.json")
+    if not changed and os.path.exists(recent_path):
+        # Snapshot invariato: basta rifiltrare il risultato dell'ultima volta
+        recent = load_json_file(recent_path)
+        if isinstance(recent, list):
+            return [t for t in recent if t.get('disclosure_date', '') >= cutoff]
+    with open(path, 'rb') as f:
+        recent = [t for t in iter_json_array(f) if t.get('disclosure_date', '') >= cutoff]
+    save_json_file(recent_path, recent)
+    return recent
+
+def check_congressional_trades(changed_only=False):
     print("   → Fetching House trades...")
-    url = "https://house-stock-watcher-data.s3-us-west-2.amazonaws.com/data/all_transactions.json"
     try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        trades = response.json()
-        cutoff = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        result = [t for t in trades if t.get('disclosure_date', '') >= cutoff]
+        result = load_recent_trades('house', HOUSE_WATCHER_URL, changed_only=changed_only)
+        if result is None:
+            print("   ✓ House trades unchanged")
+            return None
         print(f"   ✓ Found {len(result)} House trades")
         return result
     except Exception as e:
         print(f"   ✗ Congressional trades error: {e}")
         return []
 
-def check_senate_trades():
+def check_senate_trades(changed_only=False):
     print("   → Fetching Senate trades...")
-    url = "https://senate-stock-watcher-data.s3-us-west-2.amazonaws.com/aggregate/all_transactions.json"
     try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        trades = response.json()
-        cutoff = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        result = [t for t in trades if t.get('disclosure_date', '') >= cutoff]
+        result = load_recent_trades('senate', SENATE_WATCHER_URL, changed_only=changed_only)
+        if result is None:
+            print("   ✓ Senate trades unchanged")
+            return None
         print(f"   ✓ Found {len(result)} Senate trades")
         return result
     except Exception as e:
         print(f"   ✗ Senate trades error: {e}")
         return []
 
-def check_sec_filings(form_type, days_back=2, count=100):
-    print(f"   → Fetching {form_type} filings (last {days_back} days)...")
-    filings = []
+_cursors_lock = threading.Lock()
+_pending_cursors = {}
+
+def load_cursor(form_type):
+    with _cursors_lock:
+        return load_json_file(CURSORS_FILE).get(form_type, {})
+
+def commit_cursor(form_type):
+    """Salva la watermark calcolata dall'ultimo fetch, da chiamare dopo averne processato i filing"""
+    with _cursors_lock:
+        cursor = _pending_cursors.pop(form_type, None)
+        if cursor:
+            cursors = load_json_file(CURSORS_FILE)
+            cursors[form_type] = cursor
+            atomic_write(CURSORS_FILE, json.dumps(cursors, indent=1, sort_keys=True).encode())
+
+def _parse_updated(value):
+    return datetime.fromisoformat(value)
+
+def check_sec_filings(form_type, days_back=2, count=100):
+    """
+    Filing recenti dal feed getcurrent di EDGAR, pagina dopo pagina (start += count)
+    finché non si raggiunge la watermark dell'ultimo run (timestamp 'updated' più
+    recente + accession con quel timestamp) o il limite di `days_back` giorni.
+    La nuova watermark resta pending fino a commit_cursor(form_type).
+    """
+    print(f"   → Fetching {form_type} filings (last {days_back} days)...")
+    url = f"{SEC_BASE_URL}/cgi-bin/browse-edgar"
+    ns = {'atom': 'http://www.w3.org/2005/Atom'}
+    cursor = load_cursor(form_type)
+    watermark = _parse_updated(cursor['updated']) if cursor.get('updated') else None
+    known = set(cursor.get('accessions', []))
+    cutoff = (now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
+
+    def fetch_page(start):
+        params = {
+            'action': 'getcurrent',
+            'type': form_type,
+            'company': '',
+            'owner': 'include',
+            'start': start,
+            'count': count,
+            'output': 'atom'
+        }
+        response = http_get(url, params=params, headers=HEADERS, conditional=True)
+        if response.status_code != 200:
+            raise RuntimeError(f"SEC returned status {response.status_code}")
+        root = lazy_import('xml.etree.ElementTree').fromstring(response.content)
+        entries = []
+        for entry in root.findall('atom:entry', ns):
+            try:
+                updated = entry.find('atom:updated', ns).text
+                entries.append({
+                    'title': entry.find('atom:title', ns).text,
+                    'link': entry.find('atom:link', ns).attrib['href'],
+                    'date': updated[:10],
+                    'updated': updated,
+                    'type': form_type
+                })
+            except:
+                continue
+        return entries
+
+    filings = []
+    first_page = []
+    pages = 0
+    complete = False
+    try:
+        done = False
+        while not done and pages < EDGAR_MAX_PAGES:
+            entries = fetch_page(pages * count)
+            if not pages:
+                first_page = entries
+            pages += 1
+            for entry in entries:
+                updated = _parse_updated(entry['updated'])
+                # Feed ordinato dal più recente: sotto la watermark è tutto già visto; nello
+                # stesso secondo della watermark possono esserci filing nuovi dopo quelli noti
+                if watermark and updated < watermark:
+                    done = True
+                    break
+                if watermark and updated == watermark and accession_from_url(entry['link']) in known:
+                    continue
+                if entry['date'] < cutoff:
+                    done = True
+                    break
+                filings.append(entry)
+            if len(entries) < count:
+                done = True
+        if not done and filings:
+            # Limite di pagine: tenere ferma la watermark non basterebbe, il buco crescerebbe
+            # a ogni run senza mai recuperarlo. Si avanza comunque e si logga cosa si perde
+            oldest = filings[-1]['updated']
+            since = cursor['updated'] if watermark else f"{cutoff} (cutoff)"
+            print(f"   ⚠️ {form_type}: stopped after {pages} pages, filings between {since} and {oldest} skipped")
+        complete = True
+    except Exception as e:
+        print(f"   ✗ Form {form_type} error: {e}")
+
+    # Con un errore a metà la watermark non avanza, altrimenti salteremmo il buco.
+    # Al primo run senza filing nuovi (es. tutti oltre il cutoff) si parte da pagina 1
+    seed = filings or ([] if watermark else first_page)
+    if seed and complete:
+        newest = max(_parse_updated(f['updated']) for f in seed)
+        accessions = {accession_from_url(f['link']) for f in seed if _parse_updated(f['updated']) == newest}
+        if watermark == newest:
+            accessions |= known
+        with _cursors_lock:
+            _pending_cursors[form_type] = {'updated': newest.isoformat(), 'accessions': sorted(accessions)}
+    print(f"   ✓ Found {len(filings)} new {form_type} filings ({pages} pages)")
+    return filings
+
+def _to_int(text):
+    text = (text or '').strip().replace(',', '')
+    return int(float(text)) if text else 0
+
+def iter_13f_holdings(source):
+    """
+    Parsa in streaming una information table 13F (file o file-like) e produce
+    una riga per ogni <infoTable>: {'name', 'cusip', 'shares', 'value', 'put_call'}.
+    Il namespace si risolve una volta sul root e ogni riga letta viene liberata,
+    quindi la memoria resta piatta anche sui filer con decine di migliaia di righe.
+    """
+    lxml_etree = lazy_import('lxml.etree', optional=True)
+    if lxml_etree is not None:
+        context = lxml_etree.iterparse(source, events=('start', 'end'), huge_tree=True)
+    else:
+        context = lazy_import('xml.etree.ElementTree').iterparse(source, events=('start', 'end'))
+    root = None
+    for event, elem in context:
+        if root is None:
+            root = elem
+            ns = elem.tag[:elem.tag.index('}') + 1] if elem.tag.startswith('{') else ''
+            info_table = ns + 'infoTable'
+            name_tag, cusip_tag, value_tag, put_call_tag = (
+                ns + 'nameOfIssuer', ns + 'cusip', ns + 'value', ns + 'putCall')
+            shares_path = f"{ns}shrsOrPrnAmt/{ns}sshPrnamt"
+            continue
+        if event != 'end' or elem.tag != info_table:
+            continue
+        try:
+            row = {
+                'name': (elem.findtext(name_tag) or '').strip() or "Unknown",
+                'cusip': (elem.findtext(cusip_tag) or '').strip().upper(),
+                'shares': _to_int(elem.findtext(shares_path)),
+                'value': _to_int(elem.findtext(value_tag)) * 1000,  # SEC reports in thousands
+                'put_call': (elem.findtext(put_call_tag) or '').strip()
+            }
+        except ValueError:
+            row = None
+        # Libera la riga (e con lxml i fratelli già letti) prima di proseguire
+        elem.clear()
+        if lxml_etree is not None:
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        else:
+            root.clear()
+        if row is not None:
+            yield row
+
+class FilingCache:
+    """
+    Cache su disco dei documenti SEC, indirizzata per contenuto.
+    - blobs/<sha256>: documento compresso gzip; il nome è lo sha256 del blob,
+      che viene riverificato prima di ogni lettura
+    - index.json: {accession: {'docs': {nome: sha256}, 'size': byte, 'used': ts}}
+    Eviction LRU per accession quando si supera max_bytes. I blob vivi si contano
+    dall'indice (un blob può servire più accession); gli orfani lasciati da run
+    interrotti si puliscono una volta sola all'apertura.
+    """
+
+    TMP_MAX_AGE = 3600  # tmp più vecchi di così sono di download interrotti
+
+    def __init__(self, root=FILING_CACHE_DIR, max_bytes=FILING_CACHE_MAX_BYTES):
+        self.root = root
+        self.blobs = os.path.join(root, 'blobs')
+        self.index_path = os.path.join(root, 'index.json')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.dirty = False
+        os.makedirs(self.blobs, exist_ok=True)
+        self.index = load_json_file(self.index_path)
+        self.refs = Counter(d for e in self.index.values() for d in e['docs'].values())
+        self._sweep()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blobs, digest)
+
+    def _sweep(self):
+        cutoff = time.time() - self.TMP_MAX_AGE
+        for name in os.listdir(self.blobs):
+            path = self._blob_path(name)
+            try:
+                if name.startswith('.') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                elif not name.startswith('.') and name not in self.refs:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _release(self, digest):
+        self.refs[digest] -= 1
+        if self.refs[digest] <= 0:
+            del self.refs[digest]
+            with contextlib.suppress(OSError):
+                os.remove(self._blob_path(digest))
+
+    def _verify(self, digest):
+        sha = hashlib.sha256()
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+        except OSError:
+            return False
+        return sha.hexdigest() == digest
+
+    def path(self, accession, name):
+        """Path del blob gzip verificato (es. da passare a un altro processo), o None"""
+        with self.lock:
+            entry = self.index.get(accession)
+            digest = entry and entry['docs'].get(name)
+            if not digest:
+                return None
+            if not self._verify(digest):
+                print(f"   ✗ Filing cache: corrupted {name} for {accession}, dropping")
+                del entry['docs'][name]
+                self._release(digest)
+                self._save()
+                return None
+            # Il timestamp LRU si scrive al prossimo put o flush, non a ogni lettura
+            entry['used'] = time.time()
+            self.dirty = True
+        return self._blob_path(digest)
+
+    def open(self, accession, name):
+        """File-like (decompresso) del documento in cache, o None se assente/corrotto"""
+        path = self.path(accession, name)
+        return gzip.open(path, 'rb') if path else None
+
+    def get(self, accession, name):
+        f = self.open(accession, name)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def put_stream(self, accession, name, chunks):
+        """Comprime su disco i chunk (es. iter_content) e li registra sotto accession/name"""
+        tmp = os.path.join(self.blobs, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, 'wb') as raw:
+                # mtime=0: stesso contenuto -> stesso blob -> stesso indirizzo
+                with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as gz:
+                    for chunk in chunks:
+                        gz.write(chunk)
+            sha = hashlib.sha256()
+            with open(tmp, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with self.lock:
+                # Sotto lock: un _evict concorrente non deve vedere il blob prima che sia nell'indice
+                os.replace(tmp, self._blob_path(digest))
+                entry = self.index.setdefault(accession, {'docs': {}, 'size': 0, 'used': 0})
+                self.refs[digest] += 1
+                previous = entry['docs'].get(name)
+                entry['docs'][name] = digest
+                if previous:
+                    self._release(previous)
+                entry['size'] = sum(self._blob_size(d) for d in entry['docs'].values())
+                entry['used'] = time.time()
+                self._evict(keep=accession)
+                self._save()
+            return digest
+        finally:
+            # Download interrotto a metà: il tmp non deve restare nella directory
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+
+    def put(self, accession, name, data):
+        return self.put_stream(accession, name, [data])
+
+    def get_json(self, accession, name):
+        data = self.get(accession, name)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, accession, name, obj):
+        return self.put(accession, name, json.dumps(obj).encode())
+
+    def _blob_size(self, digest):
+        try:
+            return os.path.getsize(self._blob_path(digest))
+        except OSError:
+            return 0
+
+    def _evict(self, keep=None):
+        total = sum(e['size'] for e in self.index.values())
+        for accession in sorted(self.index, key=lambda a: self.index[a]['used']):
+            if total <= self.max_bytes:
+                break
+            if accession != keep:
+                entry = self.index.pop(accession)
+                total -= entry['size']
+                for digest in entry['docs'].values():
+                    self._release(digest)
+
+    def _save(self):
+        atomic_write(self.index_path, json.dumps(self.index).encode())
+        self.dirty = False
+
+    def flush(self):
+        """Scrive i timestamp LRU accumulati dalle letture"""
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+_filing_cache = None
+_filing_cache_lock = threading.Lock()
+
+def get_filing_cache():
+    global _filing_cache
+    with _filing_cache_lock:
+        if _filing_cache is None:
+            _filing_cache = FilingCache()
+        return _filing_cache
+
+class HoldingsTable:
+    """
+    Holdings 13F di un fondo per un trimestre, in colonne ordinate per CUSIP:
+    cusips (blob di CUSIP a 9 byte), shares/values (array int64), names.
+    Le righe con putCall (opzioni) sono escluse, quelle con lo stesso CUSIP sommate.
+    """
+
+    HEADER = struct.Struct('<4sHI')
+    MAGIC = b'H13F'
+    CUSIP_SIZE = 9
+
+    def __init__(self, cusips=b'', names=None, shares=None, values=None):
+        self.cusips = cusips
+        self.names = names or []
+        self.shares = shares if shares is not None else array('q')
+        self.values = values if values is not None else array('q')
+
+    @classmethod
+    def from_rows(cls, rows):
+        merged = {}
+        for row in rows:
+            if row.get('put_call') or not row['cusip']:
+                continue
+            key = row['cusip'][:cls.CUSIP_SIZE].ljust(cls.CUSIP_SIZE).encode('ascii', 'replace')
+            if key in merged:
+                merged[key][1] += row['shares']
+                merged[key][2] += row['value']
+            else:
+                merged[key] = [row['name'], row['shares'], row['value']]
+        keys = sorted(merged)
+        return cls(
+            b''.join(keys),
+            [merged[k][0] for k in keys],
+            array('q', (merged[k][1] for k in keys)),
+            array('q', (merged[k][2] for k in keys))
+        )
+
+    @classmethod
+    def from_dict(cls, holdings):
+        """Converte il vecchio formato {ticker: {'name', 'shares', 'value', 'cusip'}}"""
+        return cls.from_rows({**data, 'cusip': data.get('cusip') or ticker} for ticker, data in holdings.items())
+
+    def __len__(self):
+        return len(self.names)
+
+    def cusip(self, i):
+        return self.cusips[i * self.CUSIP_SIZE:(i + 1) * self.CUSIP_SIZE].decode('ascii').rstrip()
+
+    def row(self, i):
+        return {'name': self.names[i], 'shares': self.shares[i], 'value': self.values[i], 'cusip': self.cusip(i)}
+
+    def total_value(self):
+        return sum(self.values)
+
+    def to_bytes(self):
+        names = '\n'.join(n.replace('\n', ' ') for n in self.names).encode()
+        return (self.HEADER.pack(self.MAGIC, 1, len(self)) + self.cusips
+                + self.shares.tobytes() + self.values.tobytes() + names)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, _, n = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a holdings table")
+        pos = cls.HEADER.size
+        cusips = data[pos:pos + n * cls.CUSIP_SIZE]
+        pos += n * cls.CUSIP_SIZE
+        shares, values = array('q'), array('q')
+        shares.frombytes(data[pos:pos + n * 8])
+        values.frombytes(data[pos + n * 8:pos + n * 16])
+        names = data[pos + n * 16:].decode().split('\n') if n else []
+        return cls(cusips, names, shares, values)
+
+def fund_key(fund_name):
+    return re.sub(r'[^a-z0-9]+', '-', fund_name.lower()).strip('-') or 'unknown'
+
+def holdings_key(filing):
+    """
+    Chiave dello storico 13F: il CIK del fondo, stabile tra emendamenti e cambi di
+    nome. Lo storico salvato sotto il nome (vecchie versioni) viene spostato qui.
+    """
+    name_key = fund_key(extract_company_from_title(filing['title']))
+    cik = filing_cik(filing)
+    if not cik:
+        return name_key
+    legacy = os.path.join(HOLDINGS_DIR, name_key)
+    if os.path.isdir(legacy) and not holdings_history(cik):
+        os.makedirs(HOLDINGS_DIR, exist_ok=True)
+        os.replace(legacy, os.path.join(HOLDINGS_DIR, cik))
+    return cik
+
+def report_quarter(filing_date):
+    """Trimestre riportato da un 13F: quello chiuso prima del trimestre di deposito ('2026Q1')"""
+    year, month = int(filing_date[:4]), int(filing_date[5:7])
+    quarter = (month - 1) // 3  # trimestre precedente, 0 = Q4 dell'anno prima
+    return f"{year - 1}Q4" if quarter == 0 else f"{year}Q{quarter}"
+
+def holdings_history(key):
+    """Trimestri salvati per un fondo, dal più vecchio al più recente"""
+    directory = os.path.join(HOLDINGS_DIR, key)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-4] for f in os.listdir(directory) if f.endswith('.bin'))
+
+def holdings_path(key, quarter=None, before=None):
+    """File di `quarter`, o dell'ultimo trimestre salvato prima di `before` (None se non c'è)"""
+    if quarter is None:
+        quarters = [q for q in holdings_history(key) if before is None or q < before]
+        if not quarters:
+            return None
+        quarter = quarters[-1]
+    return os.path.join(HOLDINGS_DIR, key, f"{quarter}.bin")
+
+def load_holdings(key, quarter=None, before=None):
+    """Holdings di `quarter`, o dell'ultimo trimestre salvato prima di `before`"""
+    path = holdings_path(key, quarter, before)
+    if path is None:
+        return HoldingsTable()
     try:
-        url = "https://www.sec.gov/cgi-bin/browse-edgar"
-        for days_ago in range(days_back):
-            date = (datetime.now() - timedelta(days=days_ago)).strftime('%Y%m%d')
-            params = {
-                'action': 'getcurrent',
-                'type': form_type,
-                'company': '',
-                'dateb': date,
-                'owner': 'include',
-                'start': 0,
-                'count': count,
-                'output': 'atom'
-            }
-            time.sleep(0.15)
-            response = requests.get(url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-            if response.status_code != 200:
-                print(f"   ✗ SEC returned status {response.status_code}")
-                continue
-            root = ET.fromstring(response.content)
-            ns = {'atom': 'http://www.w3.org/2005/Atom'}
-            for entry in root.findall('atom:entry', ns):
-                try:
-                    filings.append({
-                        'title': entry.find('atom:title', ns).text,
-                        'link': entry.find('atom:link', ns).attrib['href'],
-                        'date': entry.find('atom:updated', ns).text[:10],
-                        'type': form_type
-                    })
-                except:
-                    continue
-        print(f"   ✓ Found {len(filings)} {form_type} filings")
-        return filings
-    except Exception as e:
-        print(f"   ✗ Form {form_type} error: {e}")
+        with open(path, 'rb') as f:
+            return HoldingsTable.from_bytes(f.read())
+    except (OSError, ValueError, struct.error):
+        return HoldingsTable()
+
+def save_holdings(key, quarter, table):
+    atomic_write(os.path.join(HOLDINGS_DIR, key, f"{quarter}.bin"), table.to_bytes())
+    for old in holdings_history(key)[:-HOLDINGS_HISTORY]:
+        os.remove(os.path.join(HOLDINGS_DIR, key, f"{old}.bin"))
+
+_holdings_lock = threading.Lock()
+_holdings_opened = False
+
+def open_holdings_history():
+    """Prepara lo storico 13F (import del formato legacy) solo quando c'è un 13F da processare"""
+    global _holdings_opened
+    with _holdings_lock:
+        if _holdings_opened:
+            return
+        _holdings_opened = True
+        print("   📂 Loading 13F holdings history...")
+        if os.path.exists(CACHE_13F_FILE):
+            print(f"   ✓ Imported {migrate_legacy_13f_cache()} funds from {CACHE_13F_FILE}")
+        funds = os.listdir(HOLDINGS_DIR) if os.path.isdir(HOLDINGS_DIR) else []
+        print(f"   ✓ {len(funds)} funds with stored holdings")
+
+def migrate_legacy_13f_cache():
+    """Importa il vecchio cache_13f.json (un solo snapshot per fondo) come trimestre '0000Q0'"""
+    legacy = load_json_file(CACHE_13F_FILE)
+    for fund_name, holdings in legacy.items():
+        key = fund_key(fund_name)
+        if holdings and not holdings_history(key):
+            save_holdings(key, '0000Q0', HoldingsTable.from_dict(holdings))
+    return len(legacy)
+
+_documents_lock = threading.Lock()
+
+def filing_folder_url(filing_url):
+    """Cartella EDGAR del filing (.../data/CIK/ACCESSIONNODASH/) dal link della pagina index"""
+    m = re.search(r'/Archives/edgar/data/(\d+)/(?:\d{18}/)?(\d{10}-\d{2}-\d{6})', filing_url)
+    if not m:
+        return None
+    cik, accession = m.groups()
+    return f"{SEC_BASE_URL}/Archives/edgar/data/{cik}/{accession.replace('-', '')}/"
+
+def accession_from_url(filing_url):
+    m = re.search(r'(\d{10}-\d{2}-\d{6})', filing_url)
+    return m.group(1) if m else None
+
+def list_filing_documents(filing_url):
+    """Documenti del filing letti da index.json: [{'name', 'size', 'url'}]"""
+    folder = filing_folder_url(filing_url)
+    if not folder:
         return []
+    # Niente cache condizionale: index.json non cambia e il risultato che serve è già
+    # in cache (13f_documents.json, form4.json nella FilingCache); in .cache/http
+    # finirebbe un file per ogni filing guardato, senza eviction
+    response = http_get(folder + 'index.json', headers=HEADERS)
+    response.raise_for_status()
+    return [{
+        'name': item['name'],
+        'size': int(item.get('size') or 0),
+        'url': folder + item['name']
+    } for item in response.json().get('directory', {}).get('item', [])]
+
+def resolve_13f_document(filing_url):
+    """
+    URL dell'information table di un 13F-HR, con cache su disco per accession.
+    index.json non espone il tipo di documento EDGAR: scartiamo primary_doc.xml
+    (la cover page) e preferiamo i nomi da information table, poi il più grande.
+    """
+    accession = accession_from_url(filing_url)
+    with _documents_lock:
+        cached = load_json_file(DOCUMENT_MAP_FILE).get(accession)
+    if cached:
+        return cached
+    candidates = [d for d in list_filing_documents(filing_url)
+                  if d['name'].lower().endswith('.xml') and d['name'].lower() != 'primary_doc.xml']
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda d: (bool(re.search(r'info|table', d['name'], re.I)), d['size']))
+    with _documents_lock:
+        documents = load_json_file(DOCUMENT_MAP_FILE)
+        documents[accession] = best['url']
+        atomic_write(DOCUMENT_MAP_FILE, json.dumps(documents).encode())
+    return best['url']
 
+@metrics.timed('insider_stage_seconds', stage='parse_13f')
 def parse_13f_xml(filing_url):
     """
     Scarica e parsa un filing 13F-HR dalla SEC
-    Ritorna dict: {ticker: {'shares': N, 'value': $, 'name': ...}}
+    Ritorna una HoldingsTable (colonne cusip/name/shares/value)
+    Documento grezzo e holdings parsate restano nella FilingCache: un filing
+    già visto (es. dopo un invio Telegram fallito) non tocca più la SEC.
     """
     try:
-        # Il link atom punta alla pagina index, dobbiamo trovare il file .xml
-        time.sleep(0.15)
-        response = requests.get(filing_url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        
-        # Cerca il link al file informationtable.xml o primary_doc.xml
-        xml_pattern = re.search(r'href="(/Archives/edgar/data/\d+/\d+/[^"]+\.xml)"', response.text)
-        
-        if not xml_pattern:
-            print(f"   No XML found in {filing_url}")
-            return {}
+        source = download_13f(filing_url)
+        if source is None:
+            return HoldingsTable()
         
-        xml_url = "https://www.sec.gov" + xml_pattern.group(1)
-        
-        time.sleep(0.15)
-        xml_response = requests.get(xml_url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        
-        # Parse XML
-        root = ET.fromstring(xml_response.content)
-        
-        holdings = {}
-        
-        # Namespace può variare
-        ns = {'ns': root.tag.split('}')[0].strip('{')} if '}' in root.tag else {}
-        
-        # Cerca <infoTable> elements
-        for info_table in root.findall('.//infoTable') or root.findall('.//{*}infoTable'):
-            try:
-                name_elem = info_table.find('.//nameOfIssuer') or info_table.find('.//{*}nameOfIssuer')
-                ticker_elem = info_table.find('.//cusip') or info_table.find('.//{*}cusip')
-                shares_elem = info_table.find('.//shrsOrPrnAmt/sshPrnamt') or info_table.find('.//{*}sshPrnamt')
-                value_elem = info_table.find('.//value') or info_table.find('.//{*}value')
-                
-                if not all([name_elem, shares_elem, value_elem]):
-                    continue
-                
-                name = name_elem.text.strip() if name_elem.text else "Unknown"
-                cusip = ticker_elem.text.strip() if ticker_elem.text else ""
-                shares = int(shares_elem.text) if shares_elem.text else 0
-                value = int(value_elem.text) * 1000 if value_elem.text else 0  # SEC reports in thousands
-                
-                # Converti CUSIP in ticker (approssimazione - usa il nome company)
-                ticker = cusip[:6].upper()  # CUSIP primi 6 char
-                
-                holdings[ticker] = {
-                    'name': name,
-                    'shares': shares,
-                    'value': value,
-                    'cusip': cusip
-                }
-            except Exception as e:
-                continue
+        holdings = load_13f_blob(*source)
         
+        if holdings and source[0] == 'infotable.xml':
+            get_filing_cache().put(accession_from_url(filing_url), 'holdings.bin', holdings.to_bytes())
         return holdings
     
     except Exception as e:
         print(f"   Error parsing 13F XML: {e}")
-        return {}
+        return HoldingsTable()
+
+def download_13f(filing_url):
+    """
+    Porta nella FilingCache il 13F (holdings già parsate o information table grezza)
+    e ritorna (nome, path del blob gzip), o None se il filing non ha una information table.
+    """
+    cache = get_filing_cache()
+    accession = accession_from_url(filing_url)
+    for name in ('holdings.bin', 'infotable.xml'):
+        path = cache.path(accession, name)
+        if path:
+            return name, path
+    
+    # Il link atom punta alla pagina index: l'information table si ricava da index.json
+    xml_url = resolve_13f_document(filing_url)
+    if not xml_url:
+        print(f"   No information table found in {filing_url}")
+        return None
+    
+    # Scarica in streaming direttamente nella cache compressa
+    xml_response = http_get(xml_url, headers=HEADERS, stream=True)
+    xml_response.raise_for_status()
+    cache.put_stream(accession, 'infotable.xml', xml_response.iter_content(65536))
+    xml_response.close()
+    return 'infotable.xml', cache.path(accession, 'infotable.xml')
+
+def load_13f_blob(name, path):
+    with gzip.open(path, 'rb') as f:
+        if name == 'holdings.bin':
+            return HoldingsTable.from_bytes(f.read())
+        return HoldingsTable.from_rows(iter_13f_holdings(f))
 
-def compare_13f_holdings(current, previous):
+def analyze_13f(name, path, previous_path):
     """
-    Confronta 2 holdings 13F e ritorna: new, increased, decreased, closed
+    Lavoro CPU di un 13F, eseguito in un processo del pool: parse del blob in
+    cache e diff col trimestre precedente. Ritorna (holdings serializzate,
+    variazioni, valore totale, secondi impiegati).
+    """
+    started = time.perf_counter()
+    current = load_13f_blob(name, path)
+    previous = HoldingsTable()
+    if previous_path:
+        with open(previous_path, 'rb') as f:
+            previous = HoldingsTable.from_bytes(f.read())
+    changes = compare_13f_holdings(current, previous)
+    return current.to_bytes(), changes, current.total_value(), time.perf_counter() - started
+
+@metrics.timed('insider_stage_seconds', stage='diff_13f')
+def compare_13f_holdings(current, previous, threshold=25):
+    """
+    Confronta 2 HoldingsTable 13F e ritorna: new, increased, decreased, closed
+    Join sui CUSIP ordinati: con NumPy vettoriale, altrimenti merge a due puntatori.
     """
     changes = {
         'new': [],        # Nuove posizioni
@@ -285,28 +2212,177 @@ def compare_13f_holdings(current, previous):
         'closed': []      # Chiuse
     }
     
-    # Nuove e modificate
-    for ticker, curr_data in current.items():
-        if ticker not in previous:
-            changes['new'].append((ticker, curr_data))
-        else:
-            prev_value = previous[ticker]['value']
-            curr_value = curr_data['value']
-            change_pct = ((curr_value - prev_value) / prev_value * 100) if prev_value > 0 else 0
-            
-            if abs(change_pct) >= 25:  # Solo variazioni significative >25%
-                if change_pct > 0:
-                    changes['increased'].append((ticker, curr_data, change_pct))
-                else:
-                    changes['decreased'].append((ticker, curr_data, change_pct))
+    np = lazy_import('numpy', optional=True)
+    if np is not None:
+        curr_cusips = np.frombuffer(current.cusips, dtype='S9')
+        prev_cusips = np.frombuffer(previous.cusips, dtype='S9')
+        _, ci, pi = np.intersect1d(curr_cusips, prev_cusips, assume_unique=True, return_indices=True)
+        curr_values = np.frombuffer(current.values, dtype=np.int64)[ci].astype(float)
+        prev_values = np.frombuffer(previous.values, dtype=np.int64)[pi].astype(float)
+        change_pct = np.where(prev_values > 0, (curr_values - prev_values) / np.maximum(prev_values, 1) * 100, 0)
+        significant = np.abs(change_pct) >= threshold  # Solo variazioni significative
+        matched = [(int(i), float(pct)) for i, pct in zip(ci[significant], change_pct[significant])]
+        new = np.setdiff1d(np.arange(len(current)), ci, assume_unique=True).tolist()
+        closed = np.setdiff1d(np.arange(len(previous)), pi, assume_unique=True).tolist()
+    else:
+        matched, new, closed = [], [], []
+        i = j = 0
+        size = HoldingsTable.CUSIP_SIZE
+        while i < len(current) or j < len(previous):
+            curr_key = current.cusips[i * size:(i + 1) * size] if i < len(current) else None
+            prev_key = previous.cusips[j * size:(j + 1) * size] if j < len(previous) else None
+            if prev_key is None or (curr_key is not None and curr_key < prev_key):
+                new.append(i)
+                i += 1
+            elif curr_key is None or prev_key < curr_key:
+                closed.append(j)
+                j += 1
+            else:
+                prev_value, curr_value = previous.values[j], current.values[i]
+                change_pct = ((curr_value - prev_value) / prev_value * 100) if prev_value > 0 else 0
+                if abs(change_pct) >= threshold:
+                    matched.append((i, change_pct))
+                i += 1
+                j += 1
     
-    # Chiuse
-    for ticker, prev_data in previous.items():
-        if ticker not in current:
-            changes['closed'].append((ticker, prev_data))
+    changes['new'] = [(current.cusip(i), current.row(i)) for i in new]
+    for i, change_pct in matched:
+        bucket = 'increased' if change_pct > 0 else 'decreased'
+        changes[bucket].append((current.cusip(i), current.row(i), change_pct))
+    changes['closed'] = [(previous.cusip(j), previous.row(j)) for j in closed]
     
     return changes
 
+FORM4_CODE_LABELS = {
+    'P': "🟢 ACQUISTO",
+    'S': "🔴 VENDITA",
+    'A': "🎁 ASSEGNAZIONE",
+    'M': "🔁 ESERCIZIO OPZIONI",
+    'F': "🧾 PAGAMENTO TASSE",
+    'G': "🎀 DONAZIONE",
+}
+
+def _xml_value(elem, path):
+    """Testo di <path>/value (o di <path> se non ha <value>), stripped"""
+    node = elem.find(path)
+    if node is None:
+        return ''
+    text = node.findtext('value')
+    return (text if text is not None else node.text or '').strip()
+
+def _to_float(text):
+    try:
+        return float(text.replace(',', ''))
+    except (AttributeError, ValueError):
+        return 0.0
+
+def parse_form4_xml(source):
+    """
+    Parsa l'ownership document di un Form 4 e aggrega le righe non-derivative
+    in un unico record: codice prevalente, azioni, prezzo medio, controvalore,
+    azioni possedute dopo l'ultima transazione e relazione del reporting owner.
+    """
+    root = lazy_import('xml.etree.ElementTree').parse(source).getroot()
+    owners = root.findall('reportingOwner')
+    relationship = []
+    for owner in owners[:1]:
+        rel = owner.find('reportingOwnerRelationship')
+        if rel is None:
+            continue
+        flag = lambda tag: (rel.findtext(tag) or '').strip().lower() in ('1', 'true')
+        if flag('isDirector'):
+            relationship.append('Director')
+        if flag('isOfficer'):
+            relationship.append((rel.findtext('officerTitle') or 'Officer').strip())
+        if flag('isTenPercentOwner'):
+            relationship.append('10% Owner')
+        if flag('isOther'):
+            relationship.append((rel.findtext('otherText') or 'Other').strip())
+
+    by_code = defaultdict(lambda: {'shares': 0.0, 'value': 0.0, 'count': 0})
+    shares_after = None
+    date = None
+    for tx in root.iter('nonDerivativeTransaction'):
+        code = (tx.findtext('transactionCoding/transactionCode') or '').strip()
+        shares = _to_float(_xml_value(tx, 'transactionAmounts/transactionShares'))
+        price = _to_float(_xml_value(tx, 'transactionAmounts/transactionPricePerShare'))
+        totals = by_code[code]
+        totals['shares'] += shares
+        totals['value'] += shares * price
+        totals['count'] += 1
+        totals['acquired'] = _xml_value(tx, 'transactionAmounts/transactionAcquiredDisposedCode') == 'A'
+        after = _xml_value(tx, 'postTransactionAmounts/sharesOwnedFollowingTransaction')
+        if after:
+            shares_after = _to_float(after)
+        date = _xml_value(tx, 'transactionDate') or date
+
+    record = {
+        'issuer': (root.findtext('issuer/issuerName') or '').strip(),
+        'ticker': (root.findtext('issuer/issuerTradingSymbol') or '').strip().upper(),
+        'owner': ', '.join((o.findtext('reportingOwnerId/rptOwnerName') or '').strip() for o in owners),
+        'relationship': ', '.join(relationship) or 'Insider',
+        'code': None,
+        'acquired': None,
+        'shares': 0,
+        'price': 0.0,
+        'value': 0.0,
+        'shares_after': shares_after,
+        'transactions': sum(t['count'] for t in by_code.values()),
+        'date': date,
+    }
+    if by_code:
+        # Il codice "prevalente" è quello col controvalore (o le azioni) maggiore
+        code, totals = max(by_code.items(), key=lambda kv: (kv[1]['value'], kv[1]['shares']))
+        record.update({
+            'code': code,
+            'acquired': totals['acquired'],
+            'shares': int(totals['shares']),
+            'price': totals['value'] / totals['shares'] if totals['shares'] else 0.0,
+            'value': totals['value'],
+        })
+    return record
+
+@metrics.timed('insider_stage_seconds', stage='parse_form4')
+def fetch_form4_details(filing):
+    """Record strutturato di un Form 4 (vedi parse_form4_xml), o None se non disponibile"""
+    try:
+        cache = get_filing_cache()
+        accession = accession_from_url(filing['link'])
+        details = cache.get_json(accession, 'form4.json')
+        if details:
+            return details
+        document = cache.open(accession, 'form4.xml')
+        if document is None:
+            # L'XML originale sta nella cartella del filing; le versioni renderizzate
+            # (xslF345X0*) sono sottocartelle e non finiscono tra i .xml
+            candidates = [d for d in list_filing_documents(filing['link']) if d['name'].lower().endswith('.xml')]
+            if not candidates:
+                return None
+            response = http_get(max(candidates, key=lambda d: d['size'])['url'], headers=HEADERS)
+            response.raise_for_status()
+            cache.put(accession, 'form4.xml', response.content)
+            document = cache.open(accession, 'form4.xml')
+        with document:
+            details = parse_form4_xml(document)
+        cache.put_json(accession, 'form4.json', details)
+        return details
+    except Exception as e:
+        print(f"   ✗ Form 4 parse error ({filing['link']}): {e}")
+        return None
+
+def fetch_form4_batch(filings):
+    """Dettagli dei Form 4 in parallelo (pool limitato, SEC sotto rate limit): {link: record}"""
+    links = list(dict.fromkeys(f['link'] for f in filings))
+    if not links:
+        return {}
+    by_link = {f['link']: f for f in filings}
+    with ThreadPoolExecutor(max_workers=FORM4_WORKERS) as pool:
+        return dict(zip(links, pool.map(lambda link: fetch_form4_details(by_link[link]), links)))
+
+def form4_passes_filters(details):
+    """Filtro lato server per codice transazione e controvalore minimo"""
+    return details['code'] in FORM4_CODES and details['value'] >= FORM4_MIN_VALUE
+
 def format_congressional_message(trade, source):
     owner = trade.get('representative', trade.get('senator', 'N/A'))
     ticker = trade.get('ticker', 'N/A')
@@ -319,36 +2395,55 @@ def format_congressional_message(trade, source):
     elif 'sale' in tx_type.lower():
         action_emoji = "🔴 VENDITA"
     else:
-        action_emoji = "📊 " + tx_type.upper()
+        action_emoji = "📊 " + html.escape(tx_type.upper())
     
-    vips = ['pelosi', 'trump', 'mcconnell', 'schumer', 'biden', 'warren']
-    header = "⭐️ VIP POLITICO ⭐️" if any(v in owner.lower() for v in vips) else "🏛 POLITICO"
+    header = "⭐️ VIP POLITICO ⭐️" if match_watchlist(vip_pattern(), owner) else "🏛 POLITICO"
     
+    # I campi arrivano grezzi dai feed: un '<' o '&' farebbe rifiutare il messaggio con HTML
     return f"""{header}
 
-👤 Nome: <b>{owner}</b>
+👤 Nome: <b>{html.escape(owner)}</b>
 🏢 Ruolo: Politico ({source})
 
 {action_emoji}
-📊 Ticker: <b>{ticker}</b>
-💰 Valore: {amount}
-📅 Data: {date}
+📊 Ticker: <b>{html.escape(str(ticker))}</b>
+💰 Valore: {html.escape(str(amount))}
+📅 Data: {html.escape(str(date))}
 
-{trade.get('comment', '')}"""
+{html.escape(trade.get('comment') or '')}"""
 
-def format_insider_form4_message(filing):
+def format_insider_form4_message(filing, details=None):
     title = filing['title']
     company = extract_company_from_title(title)
-    ticker = extract_ticker_from_title(title)
+    ticker = extract_ticker_from_title(title) or (details or {}).get('ticker')
     
     emoji = {"3": "🆕", "4": "📋", "5": "📅"}.get(filing['type'], "📄")
     desc = {"3": "NUOVO INSIDER", "4": "INSIDER TRADING", "5": "REPORT ANNUALE"}.get(filing['type'], "FILING")
     
     msg = f"""{emoji} <b>{desc}</b>
 
-🏢 Company: <b>{company}</b>"""
+🏢 Company: <b>{html.escape(company)}</b>"""
     if ticker:
-        msg += f"\n📊 Ticker: <b>{ticker}</b>"
+        msg += f"\n📊 Ticker: <b>{html.escape(ticker)}</b>"
+    
+    if details and details['code']:
+        action = FORM4_CODE_LABELS.get(details['code'], f"📊 CODICE {details['code']}")
+        msg += f"""
+👤 Insider: <b>{html.escape(details['owner'])}</b>
+🏢 Ruolo: {html.escape(details['relationship'])}
+
+{action}
+📊 Azioni: {details['shares']:,} @ ${details['price']:,.2f}
+💰 Valore: <b>{format_number(details['value'])}</b>"""
+        if details['shares_after'] is not None:
+            msg += f"\n📦 Dopo: {int(details['shares_after']):,} azioni"
+        if details['transactions'] > 1:
+            msg += f"\n🧾 {details['transactions']} transazioni aggregate"
+        msg += f"""
+📅 Data: {details['date'] or filing['date']}
+
+🔗 <a href="{filing['link']}">Dettagli SEC</a>"""
+        return msg
     
     msg += f"""
 👤 Ruolo: Insider/Executive
@@ -366,7 +2461,7 @@ def format_form13dg_message(filing):
     parts = title.split(' - ')
     investor = parts[1].split('(')[0].strip() if len(parts) > 1 else "Investitore"
     
-    is_notable = is_notable_investor(title)
+    is_notable = is_notable_filing(filing)
     is_amendment = '/A' in filing['type']
     
     emoji = "📊" if is_amendment else "🚨"
@@ -375,12 +2470,12 @@ def format_form13dg_message(filing):
     
     msg = f"""{header}{emoji} <b>{desc}</b>
 
-👤 Investitore: <b>{investor}</b>
+👤 Investitore: <b>{html.escape(investor)}</b>
 🏢 Ruolo: Fondo/Istituzionale
-🎯 Target: <b>{company}</b>"""
+🎯 Target: <b>{html.escape(company)}</b>"""
     
     if ticker:
-        msg += f"\n📊 Ticker: <b>{ticker}</b>"
+        msg += f"\n📊 Ticker: <b>{html.escape(ticker)}</b>"
     
     msg += f"""
 📅 Data: {filing['date']}
@@ -389,12 +2484,66 @@ def format_form13dg_message(filing):
     
     return msg
 
+class CusipIndex:
+    """
+    CUSIP (9 caratteri) → (ticker, emittente). Il CSV locale viene compilato in una
+    tabella SQLite solo quando cambia; il database si apre al primo lookup.
+    """
+
+    def __init__(self, csv_path=CUSIP_MAP_FILE, db_path=CUSIP_DB_FILE):
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self.db = None
+        self.memo = {}
+        self.lock = threading.Lock()
+
+    def _open(self):
+        csv_mtime = os.path.getmtime(self.csv_path) if os.path.exists(self.csv_path) else 0
+        db_mtime = os.path.getmtime(self.db_path) if os.path.exists(self.db_path) else -1
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS cusips (cusip TEXT PRIMARY KEY, ticker TEXT NOT NULL, issuer TEXT) WITHOUT ROWID')
+        if csv_mtime > db_mtime:
+            self._import()
+
+    def _import(self):
+        with open(self.csv_path, newline='') as f:
+            rows = [(r['cusip'].strip().upper(), r['ticker'].strip().upper(), (r.get('issuer') or '').strip())
+                    for r in csv.DictReader(f)
+                    if len((r.get('cusip') or '').strip()) == 9 and (r.get('ticker') or '').strip()]
+        with self.db:
+            self.db.execute('DELETE FROM cusips')
+            self.db.executemany('INSERT OR REPLACE INTO cusips VALUES (?, ?, ?)', rows)
+        print(f"   ✓ Loaded {len(rows)} CUSIPs from {self.csv_path}")
+
+    def lookup(self, cusip):
+        with self.lock:
+            if cusip not in self.memo:
+                if self.db is None:
+                    self._open()
+                self.memo[cusip] = self.db.execute(
+                    'SELECT ticker, issuer FROM cusips WHERE cusip = ?', (cusip,)).fetchone()
+            return self.memo[cusip]
+
+    def ticker(self, cusip):
+        row = self.lookup(cusip)
+        return row[0] if row else None
+
+_cusip_index = CusipIndex()
+
+def cusip_ticker(cusip):
+    """Ticker del CUSIP per i messaggi, o il CUSIP stesso se non è in tabella"""
+    try:
+        return _cusip_index.ticker(cusip) or cusip
+    except (OSError, sqlite3.Error, KeyError):
+        return cusip
+
 def format_13f_detailed_message(fund_name, changes, total_value):
     """Formato dettagliato per 13F con parsing completo"""
     
     msg = f"""⭐️⭐️ <b>13F - HOLDINGS TRIMESTRALE</b> ⭐️⭐️
 
-👤 Fondo: <b>{fund_name}</b>
+👤 Fondo: <b>{html.escape(fund_name)}</b>
 🏢 Ruolo: Investitore istituzionale
 💼 Valore totale portfolio: <b>{format_number(total_value)}</b>
 
@@ -405,9 +2554,9 @@ def format_13f_detailed_message(fund_name, changes, total_value):
         msg += "🆕 <b>NUOVE POSIZIONI</b>\n"
         # Ordina per valore e prendi le top 10
         top_new = sorted(changes['new'], key=lambda x: x[1]['value'], reverse=True)[:10]
-        for ticker, data in top_new:
+        for cusip, data in top_new:
             pct = (data['value'] / total_value * 100) if total_value > 0 else 0
-            msg += f"  • <b>{ticker}</b> - {data['name'][:30]}\n"
+            msg += f"  • <b>{cusip_ticker(cusip)}</b> - {html.escape(data['name'][:30])}\n"
             msg += f"    💰 {format_number(data['value'])} ({pct:.1f}% ptf) | {data['shares']:,} azioni\n"
         if len(changes['new']) > 10:
             msg += f"  ... e altre {len(changes['new']) - 10} nuove posizioni\n"
@@ -417,9 +2566,9 @@ def format_13f_detailed_message(fund_name, changes, total_value):
     if changes['increased']:
         msg += "📈 <b>AUMENTI SIGNIFICATIVI (&gt;25%)</b>\n"
         top_inc = sorted(changes['increased'], key=lambda x: abs(x[2]), reverse=True)[:8]
-        for ticker, data, change_pct in top_inc:
+        for cusip, data, change_pct in top_inc:
             pct = (data['value'] / total_value * 100) if total_value > 0 else 0
-            msg += f"  • <b>{ticker}</b> - {data['name'][:30]}\n"
+            msg += f"  • <b>{cusip_ticker(cusip)}</b> - {html.escape(data['name'][:30])}\n"
             msg += f"    📊 +{change_pct:.0f}% | {format_number(data['value'])} ({pct:.1f}% ptf)\n"
         if len(changes['increased']) > 8:
             msg += f"  ... e altri {len(changes['increased']) - 8} aumenti\n"
@@ -429,9 +2578,9 @@ def format_13f_detailed_message(fund_name, changes, total_value):
     if changes['decreased']:
         msg += "📉 <b>RIDUZIONI SIGNIFICATIVE (&gt;25%)</b>\n"
         top_dec = sorted(changes['decreased'], key=lambda x: abs(x[2]), reverse=True)[:8]
-        for ticker, data, change_pct in top_dec:
+        for cusip, data, change_pct in top_dec:
             pct = (data['value'] / total_value * 100) if total_value > 0 else 0
-            msg += f"  • <b>{ticker}</b> - {data['name'][:30]}\n"
+            msg += f"  • <b>{cusip_ticker(cusip)}</b> - {html.escape(data['name'][:30])}\n"
             msg += f"    📊 {change_pct:.0f}% | {format_number(data['value'])} ({pct:.1f}% ptf)\n"
         if len(changes['decreased']) > 8:
             msg += f"  ... e altre {len(changes['decreased']) - 8} riduzioni\n"
@@ -441,8 +2590,8 @@ def format_13f_detailed_message(fund_name, changes, total_value):
     if changes['closed']:
         msg += "❌ <b>POSIZIONI CHIUSE</b>\n"
         top_closed = sorted(changes['closed'], key=lambda x: x[1]['value'], reverse=True)[:8]
-        for ticker, data in top_closed:
-            msg += f"  • <b>{ticker}</b> - {data['name'][:30]} ({format_number(data['value'])})\n"
+        for cusip, data in top_closed:
+            msg += f"  • <b>{cusip_ticker(cusip)}</b> - {html.escape(data['name'][:30])} ({format_number(data['value'])})\n"
         if len(changes['closed']) > 8:
             msg += f"  ... e altre {len(changes['closed']) - 8} chiusure\n"
     
@@ -451,168 +2600,961 @@ def format_13f_detailed_message(fund_name, changes, total_value):
     
     return msg
 
-def main():
-    print(f"\n{'='*60}")
-    print(f"🤖 INSIDER BOT - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*60}\n")
-    
-    print("📂 Loading seen transactions...")
-    seen = load_seen()
-    new_seen = seen.copy()
-    print(f"   ✓ Loaded {len(seen)} seen items\n")
-    
-    print("📂 Loading 13F cache...")
-    cache_13f = load_json_file(CACHE_13F_FILE)
-    print(f"   ✓ Loaded {len(cache_13f)} cached funds\n")
-    
-    sent_count = 0
-    
+def fetch_all_sources():
+    """Scarica tutte le fonti in parallelo, ritorna {fonte: risultati}"""
+    jobs = {
+        'house': (check_congressional_trades, ()),
+        'senate': (check_senate_trades, ()),
+        '4': (check_sec_filings, ('4', 2, 100)),
+        'SC 13D': (check_sec_filings, ('SC 13D', 3, 50)),
+        'SC 13G': (check_sec_filings, ('SC 13G', 3, 50)),
+        'SC 13G/A': (check_sec_filings, ('SC 13G/A', 3, 50)),
+        '13F-HR': (check_sec_filings, ('13F-HR', 7, 100)),
+    }
+    def timed_fetch(name, fn, args):
+        with metrics.time('insider_stage_seconds', stage='fetch', source=name):
+            return fn(*args)
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        futures = {name: pool.submit(timed_fetch, name, fn, args) for name, (fn, args) in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+class SignalEngine:
+    """
+    Event store per (ticker, direzione) con finestra mobile di SIGNAL_WINDOW_DAYS:
+    ogni evento (insider, politico, 13D/G, fondo 13F) aggiorna in modo incrementale
+    i contatori per fonte e attore, e gli eventi usciti dalla finestra vengono
+    scalati al momento, senza mai ricalcolare dallo storico. I cluster con più
+    attori e un punteggio sufficiente diventano un unico alert "segnale".
+    Persistenza: journal JSONL (event/signal) rigiocato all'avvio, compattato alla
+    chiusura (e periodicamente nel daemon).
+    """
+
+    def __init__(self, path=SIGNALS_FILE, window_days=SIGNAL_WINDOW_DAYS):
+        self.path = path
+        self.window_days = window_days
+        self.events = defaultdict(list)   # (ticker, side) -> [(data, fonte, attore, chiave)] ordinati
+        self.actors = defaultdict(lambda: defaultdict(Counter))  # (ticker, side) -> fonte -> attore -> n
+        self.signalled = {}               # (ticker, side) -> punteggio dell'ultimo segnale
+        self.keys = set()
+        self.touched = set()
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._apply(record)
+        self.touched.clear()
+        self.file = open(path, 'a')
+
+    def _cutoff(self):
+        return (now().date() - timedelta(days=self.window_days)).isoformat()
+
+    def _apply(self, record):
+        group = (record['ticker'], record['side'])
+        if record['op'] == 'signal':
+            self.signalled[group] = record['score']
+        elif record['op'] == 'event' and record['key'] not in self.keys and record['date'] >= self._cutoff():
+            bisect.insort(self.events[group], (record['date'], record['source'], record['actor'], record['key']))
+            self.actors[group][record['source']][record['actor']] += 1
+            self.keys.add(record['key'])
+            self.touched.add(group)
+
+    def _append(self, record):
+        self._apply(record)
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def _expire(self, group):
+        """Toglie dai contatori gli eventi usciti dalla finestra (solo quelli)"""
+        events = self.events[group]
+        stale = bisect.bisect_left(events, (self._cutoff(),))
+        for _, source, actor, key in events[:stale]:
+            counts = self.actors[group][source]
+            counts[actor] -= 1
+            if counts[actor] <= 0:
+                del counts[actor]
+            self.keys.discard(key)
+        del events[:stale]
+        if not events:
+            self.events.pop(group, None)
+            self.actors.pop(group, None)
+            self.signalled.pop(group, None)
+
+    def add(self, key, ticker, side, source, actor, date):
+        """Registra un evento (idempotente sulla chiave); ticker o direzione mancanti: ignorato"""
+        ticker = (ticker or '').strip().upper()
+        if not ticker or ticker in ('N/A', '--') or side not in ('buy', 'sell') or not actor:
+            return
+        with self.lock:
+            if key in self.keys:
+                return
+            self._append({'op': 'event', 'key': key, 'ticker': ticker, 'side': side,
+                          'source': source, 'actor': actor, 'date': date[:10]})
+
+    def score(self, group):
+        """Peso per fonte x attori distinti, più un bonus per ogni fonte oltre la prima"""
+        sources = {s: len(a) for s, a in self.actors.get(group, {}).items() if a}
+        return sum(SIGNAL_WEIGHTS[s] * n for s, n in sources.items()) + max(0, len(sources) - 1)
+
+    def signals(self):
+        """
+        Segnali nuovi o rafforzati tra i ticker toccati dall'ultima chiamata:
+        [(ticker, side, punteggio, {fonte: [attori]})]
+        """
+        result = []
+        with self.lock:
+            for group in sorted(self.touched):
+                self._expire(group)
+                actors = self.actors.get(group, {})
+                score = self.score(group)
+                if group in self.signalled:
+                    # Attori usciti dalla finestra: un nuovo ingresso può ri-segnalare
+                    self.signalled[group] = min(self.signalled[group], score)
+                if (sum(len(a) for a in actors.values()) >= 2 and score >= SIGNAL_MIN_SCORE
+                        and score > self.signalled.get(group, 0)):
+                    self._append({'op': 'signal', 'ticker': group[0], 'side': group[1], 'score': score,
+                                  'ts': int(time.time())})
+                    result.append((group[0], group[1], score,
+                                   {s: sorted(a) for s, a in actors.items() if a}))
+            self.touched.clear()
+        return result
+
+    def sync(self):
+        with self.lock:
+            os.fsync(self.file.fileno())
+
+    def compact(self):
+        """Compatta il journal: restano solo gli eventi nella finestra e l'ultimo segnale per gruppo"""
+        with self.lock:
+            for group in list(self.events):
+                self._expire(group)
+            lines = [{'op': 'event', 'key': key, 'ticker': t, 'side': side, 'source': source,
+                      'actor': actor, 'date': date}
+                     for (t, side), events in self.events.items() for date, source, actor, key in events]
+            lines += [{'op': 'signal', 'ticker': t, 'side': side, 'score': score}
+                      for (t, side), score in self.signalled.items()]
+            atomic_write(self.path, ''.join(json.dumps(l, ensure_ascii=False) + '\n' for l in lines).encode())
+            self.file.close()
+            self.file = open(self.path, 'a')
+
+    def close(self):
+        self.compact()
+        with self.lock:
+            self.file.close()
+
+def format_signal_message(ticker, side, score, actors):
+    direction = "🟢 ACQUISTI" if side == 'buy' else "🔴 VENDITE"
+    count = sum(len(a) for a in actors.values())
+    msg = f"""🔥 <b>SEGNALE: {html.escape(ticker)}</b> 🔥
+
+{direction} da {count} operatori in {SIGNAL_WINDOW_DAYS} giorni
+⭐️ Punteggio: <b>{score:.1f}</b>
+"""
+    for source, label in SIGNAL_LABELS.items():
+        if actors.get(source):
+            names = ', '.join(html.escape(a) for a in actors[source][:6])
+            more = f" e altri {len(actors[source]) - 6}" if len(actors[source]) > 6 else ''
+            msg += f"\n{label}: {names}{more}"
+    return msg
+
+class Subscriptions:
+    """
+    Regole di tutti gli abbonati compilate in un unico indice condiviso
+    (ticker → chat, entità per nome o CIK → chat, form → chat che seguono la
+    watchlist dei notevoli). Un evento si valuta una volta sola: qualche lookup
+    e una passata della regex dei nomi, con costo proporzionale alle chat che
+    matchano e non al numero di abbonati.
+
+    subscriptions.json è una lista di regole, una per chat:
+    {"chat_id": "...", "tickers": [...], "entities": [...], "forms": [...],
+     "min_amount": 50000, "notable": true}
+    forms è un sottoinsieme di ALERT_FORMS (default: tutte), min_amount si applica
+    agli eventi con un importo (Form 4, politici), notable (default true) manda
+    anche gli alert della watchlist globale, come per la chat di default.
+    """
+
+    def __init__(self, rules):
+        self.rules = {}
+        self.by_ticker = defaultdict(set)
+        self.by_cik = defaultdict(set)
+        self.by_name = defaultdict(set)
+        self.by_form = defaultdict(set)  # chat che ricevono i notevoli di quella form
+        for rule in rules:
+            chat = str(rule['chat_id'])
+            forms = set(rule.get('forms') or ALERT_FORMS)
+            self.rules[chat] = (forms, float(rule.get('min_amount') or 0))
+            for ticker in rule.get('tickers', []):
+                self.by_ticker[ticker.upper()].add(chat)
+            for entity in map(str, rule.get('entities', [])):
+                if entity.strip().isdigit():
+                    self.by_cik[f"{int(entity):010d}"].add(chat)
+                elif entity.strip():
+                    self.by_name[' '.join(entity.lower().split())].add(chat)
+            if rule.get('notable', True):
+                for form in forms:
+                    self.by_form[form].add(chat)
+        self.pattern = compile_watchlist(self.by_name) if self.by_name else None
+
+    def __len__(self):
+        return len(self.rules)
+
+    def route(self, form, ticker=None, names=(), cik=None, amount=None, notable=False):
+        """Chat a cui va un evento di una delle ALERT_FORMS"""
+        chats = set(self.by_ticker.get(str(ticker or '').upper(), ()))
+        if cik in self.by_cik:
+            chats |= self.by_cik[cik]
+        if self.pattern:
+            for text in names:
+                for match in self.pattern.finditer(text or ''):
+                    chats |= self.by_name[' '.join(match.group(0).lower().split())]
+        if notable:
+            chats |= self.by_form.get(form, set())
+        return sorted(chat for chat in chats
+                      if form in self.rules[chat][0] and (amount is None or amount >= self.rules[chat][1]))
+
+def load_subscriptions(path=SUBSCRIPTIONS_FILE):
+    """Abbonati dal file, o la sola CHAT_ID con le regole di sempre se il file non c'è"""
+    rules = load_json_file(path) if os.path.exists(path) else None
+    if not rules:
+        rules = [{'chat_id': CHAT_ID}]
+    return Subscriptions(rules)
+
+class BotState:
+    """Stato condiviso dalle fonti: store dei visti, outbox, abbonati e code Telegram per chat"""
+
+    def __init__(self):
+        print("📂 Loading seen transactions...")
+        self.seen = open_seen_store()
+        print(f"   ✓ Loaded {len(self.seen)} seen items\n")
+        
+        self.outbox = Outbox()
+        self.queues = {}
+        self.subscriptions = load_subscriptions()
+        if len(self.subscriptions) > 1:
+            print(f"👥 {len(self.subscriptions)} subscribers\n")
+        self.signals = SignalEngine()
+        self.sent_count = 0
+        # Nel daemon le fonti girano su thread diversi: una alla volta tocca lo stato
+        self.lock = threading.RLock()
+
+    def queue(self, chat):
+        if chat not in self.queues:
+            self.queues[chat] = TelegramQueue(self.outbox, chat)
+        return self.queues[chat]
+
+    def route(self, form, **event):
+        """Chat abbonate a un evento (vedi Subscriptions.route)"""
+        chats = self.subscriptions.route(form, **event)
+        metrics.inc('insider_alerts_routed_total', len(chats), form=form)
+        return chats
+
+    def enqueue(self, item_id, text, label, group=None, chats=None):
+        # Un alert per chat nel journal durevole, con chiave per chat (quella della chat
+        # di default resta l'ID, come prima degli abbonati): da qui la consegna è compito
+        # dell'outbox, quindi l'ID si può segnare subito come visto
+        for chat in (chats if chats is not None else [CHAT_ID]):
+            key = item_id if chat == CHAT_ID else f"{chat}:{item_id}"
+            sent = label if chat == CHAT_ID else f"{label} → {chat}"
+            self.queue(chat).put(text, group=group, key=key,
+                                 on_sent=lambda ok, sent=sent: ok and print(f"   ✓ Sent {sent}"))
+        self.seen.add(item_id)
+
+    def flush(self, retry=False):
+        """Consegna i pending di tutte le chat e fa checkpoint; ritorna gli alert consegnati"""
+        # Solo le chat con alert in attesa: il costo segue gli alert, non gli abbonati
+        delivered = sum(self.queue(chat).flush(retry) for chat in sorted(self.outbox.pending_chats()))
+        self.sent_count += delivered
+        self.checkpoint()
+        return delivered
+
+    def checkpoint(self):
+        # Prima il journal, poi lo store dei visti: mai un ID visto senza il suo alert
+        with metrics.time('insider_stage_seconds', stage='persist'):
+            self.outbox.sync()
+            self.signals.sync()
+            self.seen.flush()
+            if _filing_cache is not None:
+                _filing_cache.flush()
+
+    def compact(self):
+        """Riscrive outbox e journal dei segnali senza le voci scadute (nel daemon, periodicamente)"""
+        with metrics.time('insider_stage_seconds', stage='compact'):
+            self.outbox.sync()
+            self.outbox.compact()
+            self.signals.compact()
+
+    def resume(self):
+        """Ritenta i pending (anche quelli falliti in questo processo) dopo aver scartato i troppo vecchi"""
+        self.outbox.expire()
+        pending = len(self.outbox.pending())
+        if pending:
+            print(f"📬 Resuming {pending} pending alerts from {OUTBOX_FILE}")
+            self.flush(retry=True)
+            print()
+
+    def close(self):
+        print("\n💾 Saving seen transactions...")
+        saved = len(self.seen)
+        self.outbox.close()
+        self.signals.close()
+        self.seen.close()
+        print(f"   ✓ Saved {saved} items, {len(self.outbox.pending())} alerts still pending\n")
+
+def process_congressional(state, trades):
     # Congressional - TUTTI I TRADES (non filtrati)
     print("🏛 CONGRESSIONAL TRADES - ALL TRADES")
     print("-" * 60)
     try:
-        all_congress_trades = check_congressional_trades() + check_senate_trades()
-        print(f"   Processing {len(all_congress_trades)} total trades...\n")
+        print(f"   Processing {len(trades)} total trades...\n")
         
-        processed = 0
-        for trade in all_congress_trades:
+        for trade in trades:
             source = 'House' if 'representative' in trade else 'Senate'
             trade_id = f"{source}_{trade.get('representative', trade.get('senator'))}_{trade.get('ticker')}_{trade.get('transaction_date')}"
             
-            # Salta solo tax payments, INVIA TUTTO IL RESTO
-            if trade_id not in seen and not is_tax_payment(trade):
-                if send_telegram(format_congressional_message(trade, source)):
-                    new_seen.add(trade_id)
-                    sent_count += 1
-                    processed += 1
-                    ticker = trade.get('ticker', 'N/A')
-                    owner = trade.get('representative', trade.get('senator', 'N/A'))
-                    print(f"   ✓ [{processed}] {ticker} by {owner}")
-                    time.sleep(1)
-            elif trade_id not in seen:
+            # Salta solo tax payments, INVIA TUTTO IL RESTO (a chi segue i politici)
+            if trade_id not in state.seen and not is_tax_payment(trade):
+                ticker = trade.get('ticker', 'N/A')
+                owner = trade.get('representative', trade.get('senator', 'N/A'))
+                chats = state.route('congress', ticker=ticker, names=[owner],
+                                    amount=amount_lower_bound(trade.get('amount')), notable=True)
+                if not chats:
+                    state.seen.add(trade_id)
+                    continue
+                state.enqueue(trade_id, format_congressional_message(trade, source), f"{ticker} by {owner}",
+                              group=f"POLITICI {source}", chats=chats)
+                tx_type = str(trade.get('type', '')).lower()
+                side = 'buy' if 'purchase' in tx_type else 'sell' if 'sale' in tx_type else None
+                state.signals.add(trade_id, ticker, side, 'congress', owner,
+                                  trade.get('disclosure_date') or now().strftime('%Y-%m-%d'))
+            elif trade_id not in state.seen:
                 # Tax payment - marca come visto senza inviare
-                new_seen.add(trade_id)
+                state.seen.add(trade_id)
         
+        processed = state.flush()
         print(f"   ✓ Sent {processed} congressional trades\n")
     except Exception as e:
         print(f"   ✗ Congressional error: {e}\n")
-    
+
+def form4_route(state, filing, form_type, details=None):
+    cik = filing_cik(filing)
+    details = details or {}
+    return state.route(form_type, ticker=details.get('ticker') or cik_ticker(cik),
+                       names=[filing['title'], details.get('owner')], cik=cik,
+                       amount=details.get('value'), notable=is_notable_filing(filing))
+
+def unseen_by_link(state, filings, prefix):
+    """
+    Entry non ancora viste raggruppate per link: Issuer/Reporting di un Form 4 e
+    Subject/Filed by di un 13D/G condividono link e ID, quindi l'ID si segna come
+    visto solo dopo aver valutato tutte le entry del filing.
+    """
+    by_link = defaultdict(list)
+    for filing in filings:
+        if f"{prefix}_{filing['link']}" not in state.seen:
+            by_link[filing['link']].append(filing)
+    return by_link
+
+def route_entries(entries, route):
+    """(entry da usare nell'alert, chat) unendo il routing di tutte le entry di un filing"""
+    routed = [(entry, route(entry)) for entry in entries]
+    chats = sorted({chat for _, entry_chats in routed for chat in entry_chats})
+    return next((entry for entry, entry_chats in routed if entry_chats), entries[0]), chats
+
+def process_form4(state, filings, form_type='4'):
     # Form 3/4/5 - SOLO PERSONAGGI FAMOSI
     print("\n📋 INSIDER TRADING (Forms 3/4/5) - Notable insiders only")
     print("-" * 60)
-    for form_type in ['4']:  # Solo Form 4 (movimenti effettivi), non 3 e 5
-        try:
-            filings = check_sec_filings(form_type, days_back=2, count=100)
-            for filing in filings:
-                filing_id = f"form{form_type}_{filing['link']}"
-                if filing_id not in seen:
-                    # Solo se è un investitore/company famosa
-                    if is_notable_investor(filing['title']):
-                        if send_telegram(format_insider_form4_message(filing)):
-                            new_seen.add(filing_id)
-                            sent_count += 1
-                            print(f"   ✓ Sent Form {form_type}: {extract_company_from_title(filing['title'])}")
-                            time.sleep(1)
-                    else:
-                        # Marca come visto per non riprocessarlo
-                        new_seen.add(filing_id)
-        except Exception as e:
-            print(f"   ✗ Form {form_type} error: {e}")
-    
+    try:
+        notable = {}
+        for link, entries in unseen_by_link(state, filings, f"form{form_type}").items():
+            # Solo se è un investitore/company famosa, o se qualche abbonato la segue
+            if route_entries(entries, lambda f: form4_route(state, f, form_type))[1]:
+                notable[link] = entries
+            else:
+                # Marca come visto per non riprocessarlo
+                state.seen.add(f"form{form_type}_{link}")
+        
+        details = fetch_form4_batch([entries[0] for entries in notable.values()])
+        print(f"   ✓ Parsed {sum(1 for d in details.values() if d)}/{len(details)} Form {form_type} documents")
+        for link, entries in notable.items():
+            filing_id = f"form{form_type}_{link}"
+            filing_details = details.get(link)
+            if filing_details and not form4_passes_filters(filing_details):
+                state.seen.add(filing_id)
+                continue
+            # Con i dettagli si conoscono ticker, owner e controvalore: routing definitivo
+            filing, chats = route_entries(entries, lambda f: form4_route(state, f, form_type, filing_details))
+            if not chats:
+                state.seen.add(filing_id)
+                continue
+            state.enqueue(filing_id, format_insider_form4_message(filing, filing_details),
+                          f"Form {form_type}: {extract_company_from_title(filing['title'])}", group="INSIDER",
+                          chats=chats)
+            if filing_details:
+                side = {'P': 'buy', 'S': 'sell'}.get(filing_details['code'])
+                state.signals.add(filing_id, filing_details['ticker'] or extract_ticker_from_title(filing['title']),
+                                  side, 'insider', filing_details['owner'], filing['date'])
+        state.flush()
+        commit_cursor(form_type)
+    except Exception as e:
+        print(f"   ✗ Form {form_type} error: {e}")
+
+def route_13dg(state, filing, form_type):
+    cik = filing_cik(filing)
+    return state.route(form_type, ticker=extract_ticker_from_title(filing['title']) or cik_ticker(cik),
+                       names=[filing['title']], cik=cik, notable=is_notable_filing(filing))
+
+def subject_13dg(entries):
+    """
+    (ticker della società target, nome del filer) dalle entry di un 13D/G: i titoli
+    Atom hanno solo CIK, il ticker si ricava dal CIK dell'entry Subject
+    """
+    subject = next((e for e in entries if '(Subject)' in e['title']), None)
+    filer = next((e for e in entries if '(Filed by)' in e['title']), entries[0])
+    return (cik_ticker(filing_cik(subject)) if subject else None), extract_company_from_title(filer['title'])
+
+def process_13dg(state, filings_by_form):
     # Form 13D/G - SOLO PERSONAGGI FAMOSI
     print("\n🚨 INSTITUTIONAL OWNERSHIP (Forms 13D/G) - Notable investors only")
     print("-" * 60)
-    for form_type in ['SC 13D', 'SC 13G', 'SC 13G/A']:
+    for form_type, filings in filings_by_form.items():
         try:
-            filings = check_sec_filings(form_type, days_back=3, count=50)
-            for filing in filings:
-                filing_id = f"{form_type}_{filing['link']}"
-                if filing_id not in seen:
-                    # Solo investitori famosi
-                    if is_notable_investor(filing['title']):
-                        if send_telegram(format_form13dg_message(filing)):
-                            new_seen.add(filing_id)
-                            sent_count += 1
-                            print(f"   ✓ Sent {form_type}: {extract_company_from_title(filing['title'])}")
-                            time.sleep(1)
-                    else:
-                        # Marca come visto
-                        new_seen.add(filing_id)
+            for link, entries in unseen_by_link(state, filings, form_type).items():
+                filing_id = f"{form_type}_{link}"
+                # Solo investitori famosi (o seguiti da qualche abbonato)
+                filing, chats = route_entries(entries, lambda f: route_13dg(state, f, form_type))
+                if chats:
+                    state.enqueue(filing_id, format_form13dg_message(filing),
+                                  f"{form_type}: {extract_company_from_title(filing['title'])}", group="13D/G",
+                                  chats=chats)
+                    # Un emendamento può anche ridurre la quota: senza il documento la direzione è ignota
+                    ticker, filer = subject_13dg(entries)
+                    state.signals.add(filing_id, ticker, None if form_type.endswith('/A') else 'buy', '13dg',
+                                      filer, filing['date'])
+                else:
+                    # Marca come visto
+                    state.seen.add(filing_id)
         except Exception as e:
             print(f"   ✗ {form_type} error: {e}")
-    
-    # Form 13F - ABILITATO (PRIORITÀ!)
+    state.flush()
+    for form_type in filings_by_form:
+        commit_cursor(form_type)
+
+def process_signals(state):
+    # Segnali: più operatori sullo stesso ticker nella finestra, un alert solo
+    signals = state.signals.signals()
+    if not signals:
+        return
+    print("\n🔥 CROSS-SOURCE SIGNALS")
+    print("-" * 60)
+    today = now().strftime('%Y-%m-%d')
+    for ticker, side, score, actors in signals:
+        chats = state.route('signal', ticker=ticker, notable=True)
+        state.enqueue(f"signal_{ticker}_{side}_{score:g}_{today}", format_signal_message(ticker, side, score, actors),
+                      f"signal {ticker} ({score:.1f})", chats=chats)
+    state.flush()
+
+def simple_13f_message(fund_name, filing):
+    return f"""⭐️ <b>13F - HOLDINGS TRIMESTRALE</b>
+
+👤 Fondo: <b>{html.escape(fund_name)}</b>
+📅 Data: {filing['date']}
+
+🔗 <a href="{filing['link']}">Vedi tutte le posizioni</a>"""
+
+def process_13f(state, filings):
+    """
+    Form 13F - ABILITATO (PRIORITÀ!)
+    Pipeline: i download girano su thread sotto il rate limit SEC, parse e diff
+    (CPU) su un pool di processi che legge i blob dalla FilingCache, e ogni
+    fondo viene inviato e salvato nello storico appena è pronto, così il tempo
+    totale si avvicina a quello del fondo più lento invece che alla somma.
+    """
     print("\n💼 13F QUARTERLY HOLDINGS - PRIORITY")
     print("-" * 60)
     try:
-        filings = check_sec_filings('13F-HR', days_back=7, count=100)
-        
+        todo, routes = [], {}
         for filing in filings:
             filing_id = f"13f_{filing['link']}"
-            
-            if filing_id in seen:
+            if filing_id in state.seen:
                 continue
-            
-            # Solo investitori famosi
-            if not is_notable_investor(filing['title']):
-                new_seen.add(filing_id)
+            # Solo investitori famosi (o fondi seguiti da qualche abbonato)
+            cik = filing_cik(filing)
+            routes[filing['link']] = state.route('13F-HR', names=[filing['title']], cik=cik,
+                                                 notable=is_notable_filing(filing))
+            if not routes[filing['link']]:
+                state.seen.add(filing_id)
                 continue
-            
-            fund_name = extract_company_from_title(filing['title'])
-            
-            print(f"   → Parsing {fund_name}...")
-            
-            # Scarica e parsa 13F corrente
-            current_holdings = parse_13f_xml(filing['link'])
-            
-            if not current_holdings:
-                print(f"      ✗ Failed to parse XML, sending simple alert")
-                # Fallback: invia notifica semplice
-                msg = f"""⭐️ <b>13F - HOLDINGS TRIMESTRALE</b>
+            todo.append(filing)
+        if todo:
+            open_holdings_history()
+            run_13f_pipeline(state, todo, routes)
+        state.flush()
+        commit_cursor('13F-HR')
+    except Exception as e:
+        print(f"   ✗ 13F error: {e}\n")
 
-👤 Fondo: <b>{fund_name}</b>
-📅 Data: {filing['date']}
+def record_13f_signals(state, filing, fund_name, changes):
+    # Nel motore dei segnali vanno le variazioni principali con ticker noto
+    accession = accession_from_url(filing['link'])
+    kinds = (('new', 'buy'), ('increased', 'buy'), ('decreased', 'sell'), ('closed', 'sell'))
+    if holdings_path(holdings_key(filing), before=report_quarter(filing['date'])) is None:
+        # Primo trimestre nello storico: ogni posizione risulta 'new', non sono acquisti
+        kinds = (('increased', 'buy'), ('decreased', 'sell'))
+    for kind, side in kinds:
+        top = sorted(changes[kind], key=lambda change: change[1]['value'], reverse=True)[:SIGNAL_13F_TOP]
+        for cusip, *_ in top:
+            ticker = cusip_ticker(cusip)
+            if ticker != cusip:
+                state.signals.add(f"13f_{accession}_{cusip}", ticker, side, '13f', fund_name, filing['date'])
 
-🔗 <a href="{filing['link']}">Vedi tutte le posizioni</a>"""
-                send_telegram(msg)
-                new_seen.add(filing_id)
-                sent_count += 1
-                time.sleep(1)
-                continue
-            
-            # Calcola valore totale
-            total_value = sum(h['value'] for h in current_holdings.values())
-            print(f"      ✓ Parsed {len(current_holdings)} positions worth {format_number(total_value)}")
-            
-            # Cerca 13F precedente in cache
-            previous_holdings = cache_13f.get(fund_name, {})
-            
-            # Confronta
-            changes = compare_13f_holdings(current_holdings, previous_holdings)
-            
-            # Invia notifica dettagliata
-            msg = format_13f_detailed_message(fund_name, changes, total_value)
-            
-            if send_telegram(msg):
-                new_seen.add(filing_id)
-                sent_count += 1
-                print(f"      ✅ Sent detailed 13F for {fund_name}")
+def run_13f_pipeline(state, filings, routes=None):
+    routes = routes or {}
+    workers = min(len(filings), HOLDINGS_PARSE_WORKERS)
+    if workers > 1:
+        # spawn: un fork con i thread di download attivi potrebbe ereditare lock presi
+        parsers = lazy_import('concurrent.futures.process').ProcessPoolExecutor(
+            max_workers=workers, mp_context=lazy_import('multiprocessing').get_context('spawn'))
+    else:
+        # Un solo core (o un solo fondo): i processi costerebbero più di quanto rendono
+        parsers = ThreadPoolExecutor(max_workers=1)
+    downloads = ThreadPoolExecutor(max_workers=HOLDINGS_DOWNLOAD_WORKERS)
+    with downloads, parsers:
+        pending = {downloads.submit(download_13f, f['link']): ('download', f, None) for f in filings}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, filing, source = pending.pop(future)
+                fund_name = extract_company_from_title(filing['title'])
+                filing_id = f"13f_{filing['link']}"
+                quarter = report_quarter(filing['date'])
+                key = holdings_key(filing)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"      ✗ {fund_name}: {step} failed ({e})")
+                    result = None
+                    if step == 'analyze':
+                        # Es. blob espulso dalla cache nel frattempo: si rifà tutto qui
+                        current = parse_13f_xml(filing['link'])
+                        if current:
+                            previous = load_holdings(key, before=quarter)
+                            result = (current.to_bytes(), compare_13f_holdings(current, previous),
+                                      current.total_value(), 0.0)
                 
-                # Salva in cache per il prossimo trimestre
-                cache_13f[fund_name] = current_holdings
-                save_json_file(CACHE_13F_FILE, cache_13f)
+                if step == 'download' and result is not None:
+                    print(f"   → Parsing {fund_name}...")
+                    pending[parsers.submit(analyze_13f, *result, holdings_path(key, before=quarter))] = (
+                        'analyze', filing, result)
+                    continue
+                
+                current = HoldingsTable.from_bytes(result[0]) if result else HoldingsTable()
+                if not current:
+                    print(f"      ✗ Failed to parse XML for {fund_name}, sending simple alert")
+                    # Fallback: invia notifica semplice
+                    state.enqueue(filing_id, simple_13f_message(fund_name, filing), f"simple 13F for {fund_name}",
+                                  chats=routes.get(filing['link']))
+                    state.flush()
+                    continue
+                
+                _, changes, total_value, elapsed = result
+                metrics.observe('insider_stage_seconds', elapsed, stage='analyze_13f')
+                print(f"      ✓ {fund_name}: {len(current)} positions worth {format_number(total_value)}")
+                if source and source[0] == 'infotable.xml':
+                    get_filing_cache().put(accession_from_url(filing['link']), 'holdings.bin', result[0])
                 
-                time.sleep(2)  # Pausa più lunga per messaggi lunghi
+                # L'alert è nel journal: salva subito nello storico per il prossimo trimestre
+                state.enqueue(filing_id, format_13f_detailed_message(fund_name, changes, total_value),
+                              f"detailed 13F for {fund_name}", chats=routes.get(filing['link']))
+                save_holdings(key, quarter, current)
+                record_13f_signals(state, filing, fund_name, changes)
+                state.flush()
+
+def main():
+    print(f"\n{'='*60}")
+    print(f"🤖 INSIDER BOT - {now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"{'='*60}\n")
+    
+    # Prima la rete, poi lo stato locale: la prima richiesta parte subito
+    print("🌐 FETCHING ALL SOURCES")
+    print("-" * 60)
+    started = time.monotonic()
+    sources = fetch_all_sources()
+    print(f"   ✓ Fetched {len(sources)} sources in {time.monotonic() - started:.1f}s\n")
+    
+    state = BotState()
+    state.resume()
+    with metrics.time('insider_stage_seconds', stage='process', source='congress'):
+        process_congressional(state, sources['house'] + sources['senate'])
+    with metrics.time('insider_stage_seconds', stage='process', source='form4'):
+        process_form4(state, sources['4'])  # Solo Form 4 (movimenti effettivi), non 3 e 5
+    with metrics.time('insider_stage_seconds', stage='process', source='13dg'):
+        process_13dg(state, {form_type: sources[form_type] for form_type in ['SC 13D', 'SC 13G', 'SC 13G/A']})
+    with metrics.time('insider_stage_seconds', stage='process', source='13f'):
+        process_13f(state, sources['13F-HR'])
+    process_signals(state)
+    state.close()
+    export_metrics()
+    
+    print(f"{'='*60}")
+    print(f"✅ BOT COMPLETED - Sent {state.sent_count} alerts")
+    print(f"{'='*60}\n")
+
+def export_metrics():
+    try:
+        metrics.export()
+        print(f"📈 {metrics.summary()}")
+        print(f"   ✓ Metrics written to {METRICS_FILE}\n")
     except Exception as e:
-        print(f"   ✗ 13F error: {e}\n")
+        print(f"   ✗ Metrics export failed: {e}\n")
+
+def run_profiled(fn, path):
+    """
+    Esegue fn sotto profiler: pyinstrument (report HTML) se `path` finisce in
+    .html e il pacchetto è installato, altrimenti cProfile (file .prof per pstats).
+    """
+    pyinstrument = lazy_import('pyinstrument', optional=True)
+    if path.endswith('.html') and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            return fn()
+        finally:
+            profiler.stop()
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+            print(f"🔬 Profile written to {path}")
+    profiler = lazy_import('cProfile').Profile()
+    try:
+        return profiler.runcall(fn)
+    finally:
+        profiler.dump_stats(path)
+        print(f"🔬 Profile written to {path}")
+
+def run_recorded(fn, path):
+    """Esegue fn registrando ogni risposta dei fetcher nell'archivio `path`"""
+    global _recorder
+    _recorder = ResponseRecorder(path)
+    try:
+        return fn()
+    finally:
+        recorder, _recorder = _recorder, None
+        recorder.close()
+        print(f"📼 Recorded {recorder.count} responses to {path}")
+
+def run_replay(path, workdir=None):
+    """
+    Rigioca un archivio di --record: un main() per ogni run registrato, senza rete
+    né attese, con l'orologio virtuale al tempo della registrazione e un sink
+    Telegram finto. Lo stato (visti, outbox, storico 13F, cache) parte da
+    `workdir`, di default una directory nuova con la sola configurazione copiata,
+    così lo stato vero del bot non viene toccato.
+    """
+    global _replay, _virtual_time
+    path = os.path.abspath(path)
+    workdir = os.path.abspath(workdir or lazy_import('tempfile').mkdtemp(prefix='insider-replay-'))
+    os.makedirs(os.path.join(workdir, CACHE_DIR), exist_ok=True)
+    for name in (CUSIP_MAP_FILE, SUBSCRIPTIONS_FILE, NOTABLE_INDEX_FILE):
+        target = os.path.join(workdir, name)
+        if os.path.exists(name) and not os.path.exists(target):
+            lazy_import('shutil').copyfile(name, target)
+    os.chdir(workdir)
+    print(f"📼 Replaying {path} in {workdir}")
     
-    print("\n💾 Saving seen transactions...")
-    save_seen(new_seen)
-    print(f"   ✓ Saved {len(new_seen)} items\n")
+    _replay = ResponseReplay(REPLAY_ALERTS_FILE)
+    started = time.perf_counter()
+    runs, first, last = 0, None, None
+    try:
+        for ts, records in iter_archive_runs(path):
+            _replay.start_run(ts, records)
+            main()
+            runs += 1
+            first = first or ts
+            last = _virtual_time
+    finally:
+        replay, _replay = _replay, None
+        _virtual_time = None
+        replay.close()
+    elapsed = time.perf_counter() - started
     
     print(f"{'='*60}")
-    print(f"✅ BOT COMPLETED - Sent {sent_count} alerts")
+    print(f"📼 REPLAY - {runs} runs in {elapsed:.1f}s")
+    if runs:
+        span = last - first
+        print(f"   Recorded span: {timedelta(seconds=int(span))} ({span / max(elapsed, 1e-9):,.0f}x real time)")
+    print(f"   Responses: {replay.served} served, {replay.missing} not in archive, "
+          f"{replay.bytes / 2**20:.1f} MB ({replay.served / max(elapsed, 1e-9):,.0f}/s, "
+          f"{replay.bytes / 2**20 / max(elapsed, 1e-9):.1f} MB/s)")
+    print(f"   Alerts: {replay.sent} would have been sent ({replay.sent / max(elapsed, 1e-9):,.1f}/s) "
+          f"→ {os.path.join(workdir, REPLAY_ALERTS_FILE)}")
+    print(f"{'='*60}\n")
+
+def edgar_index_urls(start, end):
+    """
+    Master index EDGAR che coprono [start, end] (date): full-index/master.gz per
+    i trimestri interamente chiusi nell'intervallo, daily-index per gli altri giorni.
+    """
+    base = f"{SEC_BASE_URL}/Archives/edgar"
+    today = datetime.now().date()
+    year, quarter = start.year, (start.month - 1) // 3 + 1
+    while (year, quarter) <= (end.year, (end.month - 1) // 3 + 1):
+        q_start = datetime(year, 3 * quarter - 2, 1).date()
+        q_end = (datetime(year + quarter // 4, 3 * quarter % 12 + 1, 1) - timedelta(days=1)).date()
+        if start <= q_start and end >= q_end and q_end < today:
+            yield f"{base}/full-index/{year}/QTR{quarter}/master.gz"
+        else:
+            day = max(start, q_start)
+            while day <= min(end, q_end):
+                if day.weekday() < 5:
+                    yield f"{base}/daily-index/{year}/QTR{quarter}/master.{day.strftime('%Y%m%d')}.idx"
+                day += timedelta(days=1)
+        year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+
+def iter_master_index(url):
+    """Righe di un master index (CIK|Company|Form|Date|Filename) lette in streaming"""
+    response = http_get(url, headers=HEADERS, stream=True)
+    if response.status_code == 404:
+        response.close()
+        return  # festivo: nessun daily index
+    response.raise_for_status()
+    response.raw.decode_content = True
+    raw = gzip.GzipFile(fileobj=response.raw) if url.endswith('.gz') else response.raw
+    in_header = True
+    with response:
+        for line in io.TextIOWrapper(raw, encoding='latin-1'):
+            if in_header:
+                in_header = not line.startswith('---')
+                continue
+            parts = line.rstrip('\n').split('|')
+            if len(parts) != 5:
+                continue
+            cik, company, form_type, date, filename = parts
+            if len(date) == 8:  # i daily index usano YYYYMMDD
+                date = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+            yield cik, company, form_type, date, filename
+
+def filing_from_index_row(cik, company, form_type, date, filename):
+    """Filing nello stesso formato delle entry Atom di check_sec_filings"""
+    accession = accession_from_url(filename)
+    return {
+        'title': f"{form_type} - {company} ({int(cik):010d}) (Filer)",
+        'link': f"{SEC_BASE_URL}/Archives/edgar/data/{int(cik)}/{accession.replace('-', '')}/{accession}-index.htm",
+        'date': date,
+        'updated': f"{date}T00:00:00",
+        'type': form_type
+    }
+
+def backfill_filing(filing):
+    """Passa un filing storico al parser giusto; per i 13F salva il trimestre nello storico"""
+    if filing['type'] == '13F-HR':
+        open_holdings_history()
+        key = holdings_key(filing)
+        quarter = report_quarter(filing['date'])
+        if quarter in holdings_history(key):
+            return True
+        holdings = parse_13f_xml(filing['link'])
+        if holdings:
+            save_holdings(key, quarter, holdings)
+        return bool(holdings)
+    if filing['type'] == '4':
+        return fetch_form4_details(filing) is not None
+    return True
+
+def run_backfill(start, end, forms, send=False):
+    """
+    Backfill offline dai master index EDGAR: un solo passaggio per file filtra
+    form type e filer notevoli, poi i filing vanno ai parser su un pool di thread.
+    Il checkpoint (index e accession già fatti) rende il comando riprendibile;
+    con send=True i filing passano anche dalla pipeline normale di alert.
+    """
+    print(f"\n{'='*60}")
+    print(f"📚 BACKFILL {start} → {end} ({', '.join(forms)})")
+    print(f"{'='*60}\n")
+    checkpoint = load_json_file(BACKFILL_CHECKPOINT)
+    done_indexes = set(checkpoint.get('indexes', []))
+    done_filings = set(checkpoint.get('filings', []))
+    selected = defaultdict(list)
+    listed = set()
+
+    def save_checkpoint():
+        atomic_write(BACKFILL_CHECKPOINT, json.dumps({
+            'indexes': sorted(done_indexes), 'filings': sorted(done_filings)
+        }).encode())
+
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as pool:
+        for url in edgar_index_urls(start, end):
+            if url in done_indexes:
+                continue
+            print(f"   → {url.split('/Archives/edgar/')[1]}")
+            batch = {}
+            try:
+                for cik, company, form_type, date, filename in iter_master_index(url):
+                    if form_type not in forms or not (str(start) <= date <= str(end)):
+                        continue
+                    if not lookup_notable(f"{int(cik):010d}", company):
+                        continue
+                    # un Form 4 compare una riga per issuer e una per ogni reporting owner
+                    accession = accession_from_url(filename)
+                    if accession in listed:
+                        continue
+                    listed.add(accession)
+                    filing = filing_from_index_row(cik, company, form_type, date, filename)
+                    selected[form_type].append(filing)
+                    if accession not in done_filings:
+                        batch[accession] = filing
+            except Exception as e:
+                print(f"   ✗ {url}: {e}")
+                continue
+            for accession, ok in zip(batch, pool.map(backfill_filing, batch.values())):
+                if ok:
+                    done_filings.add(accession)
+            print(f"      ✓ {len(batch)} notable filings processed")
+            done_indexes.add(url)
+            save_checkpoint()
+
+    print(f"\n   ✓ Selected {sum(len(f) for f in selected.values())} filings")
+    if send:
+        state = BotState()
+        state.resume()
+        if selected.get('4'):
+            process_form4(state, selected['4'])
+        dg = {f: selected[f] for f in ['SC 13D', 'SC 13G', 'SC 13G/A'] if selected.get(f)}
+        if dg:
+            process_13dg(state, dg)
+        if selected.get('13F-HR'):
+            process_13f(state, selected['13F-HR'])
+        process_signals(state)
+        state.close()
+    export_metrics()
+    print("✅ BACKFILL COMPLETED\n")
+
+def edgar_is_open(now=None):
+    """EDGAR accetta filing nei giorni feriali dalle 6:00 alle 22:00 ora di New York"""
+    now = now or datetime.now(EDGAR_TZ)
+    return now.weekday() < 5 and 6 <= now.hour < 22
+
+def daemon_jobs():
+    """
+    Fonti del daemon: (nome, intervallo in secondi, fetch, process).
+    Il fetch gira senza lock, il process con lo stato bloccato.
+    """
+    def form4_interval():
+        return 60 if edgar_is_open() else 900
+    
+    def fetch_watchers():
+        # Poll condizionale su S3: si processa solo se un ETag è cambiato
+        trades = [check_congressional_trades(changed_only=True), check_senate_trades(changed_only=True)]
+        if all(t is None for t in trades):
+            return None
+        return (trades[0] or []) + (trades[1] or [])
+    
+    return [
+        ('congress', lambda: 300, fetch_watchers, process_congressional),
+        ('form4', form4_interval, lambda: check_sec_filings('4', 2, 100), process_form4),
+        ('13dg', lambda: 300,
+         lambda: {f: check_sec_filings(f, 3, 50) for f in ['SC 13D', 'SC 13G', 'SC 13G/A']}, process_13dg),
+        ('13f', lambda: 3600, lambda: check_sec_filings('13F-HR', 7, 100), process_13f),
+    ]
+
+def run_daemon():
+    """
+    Modalità residente: ogni fonte viene interrogata con la sua cadenza, stato e
+    pool di connessioni restano in memoria, checkpoint periodici su disco e
+    chiusura pulita su SIGTERM/SIGINT.
+    """
+    print(f"\n{'='*60}")
+    print(f"🤖 INSIDER BOT DAEMON - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}\n")
+    
+    state = BotState()
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        print(f"\n🛑 Received signal {signum}, shutting down...")
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    jobs = daemon_jobs()
+    next_run = {name: 0 for name, *_ in jobs}
+    running = {}
+    
+    def run_job(name, fetch, process):
+        try:
+            with metrics.time('insider_stage_seconds', stage='fetch', source=name):
+                result = fetch()
+            if result is None:
+                return
+            with state.lock, metrics.time('insider_stage_seconds', stage='process', source=name):
+                process(state, result)
+                process_signals(state)
+        except Exception as e:
+            print(f"   ✗ {name} job error: {e}")
+    
+    with state.lock:
+        state.resume()
+    last_checkpoint = last_compact = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            while not stop.is_set():
+                now = time.monotonic()
+                for name, interval, fetch, process in jobs:
+                    # Una fonte non riparte finché il giro precedente non è finito
+                    if now >= next_run[name] and (name not in running or running[name].done()):
+                        running[name] = pool.submit(run_job, name, fetch, process)
+                        next_run[name] = now + interval()
+                if now - last_checkpoint >= DAEMON_CHECKPOINT:
+                    # Un errore di I/O qui non deve fermare il daemon: si riprova al prossimo giro
+                    try:
+                        with state.lock:
+                            # Gli alert falliti si ritentano qui, non a ogni flush delle fonti
+                            state.resume()
+                            state.checkpoint()
+                            if now - last_compact >= DAEMON_COMPACT:
+                                state.compact()
+                                last_compact = now
+                        metrics.export()
+                    except Exception as e:
+                        print(f"   ✗ Checkpoint error: {e}")
+                    last_checkpoint = now
+                stop.wait(max(1, min(next_run.values()) - time.monotonic()))
+            print("   → Waiting for running jobs...")
+    finally:
+        state.close()
+        export_metrics()
+    print(f"✅ DAEMON STOPPED - Sent {state.sent_count} alerts\n")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Insider trading alert bot")
+    parser.add_argument('--daemon', action='store_true', help="run as a resident service instead of a single pass")
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'),
+                        help="ingest filings from the EDGAR master indexes between two dates (YYYY-MM-DD)")
+    parser.add_argument('--forms', default='13F-HR,4', help="form types for --backfill (comma separated)")
+    parser.add_argument('--send', action='store_true', help="with --backfill, also send alerts for the filings found")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="profile the run: cProfile stats to PATH, or a pyinstrument report if PATH ends in .html")
+    parser.add_argument('--record', metavar='ARCHIVE',
+                        help="append every fetched response to a compressed archive (.jsonl.gz) for --replay")
+    parser.add_argument('--replay', metavar='ARCHIVE',
+                        help="run the bot offline over a recorded archive, with a fake Telegram sink")
+    parser.add_argument('--replay-dir', metavar='DIR', help="state directory for --replay (default: a new temp dir)")
+    args = parser.parse_args()
+    if args.replay:
+        run = lambda: run_replay(args.replay, args.replay_dir)
+    elif args.backfill:
+        start, end = (datetime.strptime(d, '%Y-%m-%d').date() for d in args.backfill)
+        run = lambda: run_backfill(start, end, set(args.forms.split(',')), send=args.send)
+    elif args.daemon:
+        run = run_daemon
+    else:
+        run = main
+    if args.record:
+        run = functools.partial(run_recorded, run, os.path.abspath(args.record))
+    if args.profile:
+        run_profiled(run, args.profile)
+    else:
+        run()
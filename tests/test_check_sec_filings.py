@@ -0,0 +1,122 @@
+"""
+Paginazione del feed getcurrent in check_sec_filings su un feed finto, con la
+watermark salvata in una directory temporanea.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'bench')]
+os.environ.setdefault('TELEGRAM_TOKEN', 'test')
+os.environ.setdefault('CHAT_ID', 'test')
+
+import bot
+import fixtures
+
+BASE_URL = 'https://www.sec.gov'
+
+class CheckSecFilingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.feed = []
+        self.http_get = bot.http_get
+        self.max_pages = bot.EDGAR_MAX_PAGES
+        bot.http_get = self.fake_get
+        bot._pending_cursors.clear()
+
+    def tearDown(self):
+        bot.http_get = self.http_get
+        bot.EDGAR_MAX_PAGES = self.max_pages
+        bot._pending_cursors.clear()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def fake_get(self, url, params=None, **kwargs):
+        content = fixtures.atom_page(self.feed, params['start'], params['count'])
+        return SimpleNamespace(status_code=200, content=content)
+
+    def entries(self, first, total, newest=None):
+        """`total` entry del feed dalla più recente, numerate da `first`"""
+        newest = newest or datetime.now().replace(microsecond=0)
+        entries = fixtures.feed_entries(BASE_URL, '4', newest, first + total)[first:]
+        for n, entry in enumerate(entries):
+            entry['updated'] = (newest - timedelta(minutes=2 * n)).isoformat() + '-04:00'
+        return entries
+
+    def old_entries(self, total):
+        """Feed del run precedente, un'ora prima delle entry nuove"""
+        return self.entries(0, total, datetime.now().replace(microsecond=0) - timedelta(hours=1))
+
+    def run_once(self, days_back=2):
+        filings = bot.check_sec_filings('4', days_back, 10)
+        bot.commit_cursor('4')
+        return [f['link'] for f in filings]
+
+    def links(self, entries):
+        return [e['link'] for e in entries]
+
+    def test_first_run_seeds_cursor(self):
+        self.feed = self.old_entries(25)
+        self.assertEqual(self.run_once(), self.links(self.feed))
+        cursor = bot.load_cursor('4')
+        self.assertEqual(bot._parse_updated(cursor['updated']), bot._parse_updated(self.feed[0]['updated']))
+
+    def test_first_run_seeds_cursor_from_first_page(self):
+        # Tutto oltre il cutoff: nessun filing, ma la watermark parte comunque da pagina 1
+        self.feed = self.entries(0, 25, datetime.now().replace(microsecond=0) - timedelta(days=5))
+        self.assertEqual(self.run_once(), [])
+        self.feed = self.entries(100, 3) + self.feed
+        self.assertEqual(self.run_once(), self.links(self.feed[:3]))
+
+    def test_only_new_filings_after_watermark(self):
+        self.feed = self.old_entries(25)
+        self.run_once()
+        self.feed = self.entries(100, 12) + self.feed
+        self.assertEqual(self.run_once(), self.links(self.feed[:12]))
+        self.assertEqual(self.run_once(), [])
+
+    def test_new_filing_in_watermark_second(self):
+        self.feed = self.old_entries(25)
+        self.run_once()
+        late = self.entries(100, 1)[0]
+        late['updated'] = self.feed[0]['updated']
+        self.feed.insert(1, late)
+        self.assertEqual(self.run_once(), [late['link']])
+        self.assertEqual(self.run_once(), [])
+
+    def test_page_cap_advances_cursor(self):
+        bot.EDGAR_MAX_PAGES = 2
+        self.feed = self.old_entries(50)
+        self.assertEqual(self.run_once(), self.links(self.feed[:20]))
+        # Il buco oltre il limite di pagine va perso, ma i run successivi non restano fermi
+        self.feed = self.entries(100, 5) + self.feed
+        self.assertEqual(self.run_once(), self.links(self.feed[:5]))
+        self.assertEqual(self.run_once(), [])
+
+    def test_error_holds_cursor(self):
+        self.feed = self.old_entries(25)
+        self.run_once()
+        cursor = bot.load_cursor('4')
+        self.feed = self.entries(100, 15) + self.feed
+        fake_get = bot.http_get
+        def failing_get(url, params=None, **kwargs):
+            if params['start']:
+                raise ConnectionError('reset')
+            return fake_get(url, params=params, **kwargs)
+        bot.http_get = failing_get
+        self.run_once()
+        self.assertEqual(bot.load_cursor('4'), cursor)
+        bot.http_get = fake_get
+        self.assertEqual(self.run_once(), self.links(self.feed[:15]))
+
+if __name__ == '__main__':
+    unittest.main()